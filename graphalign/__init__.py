@@ -1,3 +1,6 @@
-from .needleman_wunch import get_align_func, get_score_mat, DNAAlphabet
-from .sequencegraph import SequenceGraph, alignment_to_sequencegraph, Alignment
+from .needleman_wunch import get_align_func, get_score_mat, DNAAlphabet, prepare_graph
+from .batch import BatchAligner
+from .sequencegraph import (SequenceGraph, CompactSequenceGraph, alignment_to_sequencegraph, Alignment,
+                            compact_graph, extract_subgraph, get_position_index)
+from .graphfile import save_graph, load_graph
 from .datastructs import *
@@ -0,0 +1,114 @@
+import os
+from multiprocessing import Pool, shared_memory
+import numpy as np
+
+from .needleman_wunch import get_align_func, prepare_graph, PreparedGraph
+from .sequencegraph import CompactSequenceGraph, PrevIndex
+
+_worker = {}
+
+
+def _share_arrays(arrays):
+    """Copy arrays into one shared memory block
+
+    Returns the block and the (shape, dtype, offset) of each array in it.
+    """
+    shm = shared_memory.SharedMemory(create=True, size=max(1, sum(a.nbytes for a in arrays)))
+    specs = []
+    offset = 0
+    for array in arrays:
+        view = np.ndarray(array.shape, array.dtype, buffer=shm.buf, offset=offset)
+        view[:] = array
+        specs.append((array.shape, array.dtype.str, offset))
+        offset += array.nbytes
+    return shm, specs
+
+
+def _share_graph(prepared):
+    graph, (indptr, indices, is_linear), last_use = prepared
+    if not isinstance(graph, CompactSequenceGraph):
+        graph = CompactSequenceGraph.from_graph(graph)
+    return _share_arrays([graph.node_offsets, graph.adj_indptr, graph.adj_indices,
+                          graph.rev_indptr, graph.rev_indices, indptr, indices, last_use,
+                          graph.sequences, is_linear])
+
+
+def _init_worker(name, specs, align_args):
+    shm = shared_memory.SharedMemory(name=name)
+    (node_offsets, adj_indptr, adj_indices, rev_indptr, rev_indices,
+     indptr, indices, last_use, sequences, is_linear) = (
+         np.ndarray(shape, dtype, buffer=shm.buf, offset=offset)
+         for shape, dtype, offset in specs)
+    graph = CompactSequenceGraph(sequences, node_offsets, adj_indptr, adj_indices,
+                                 rev_indptr, rev_indices)
+    _worker["shm"] = shm
+    _worker["graph"] = PreparedGraph(graph, PrevIndex(indptr, indices, is_linear), last_use)
+    args, kwargs = align_args
+    _worker["align"] = get_align_func(*args, **kwargs)
+
+
+def _align_chunk(queries):
+    return [_worker["align"](_worker["graph"], query) for query in queries]
+
+
+class BatchAligner:
+    """Aligns many queries against one graph
+
+    The graph is indexed once, and every query is aligned as seq_b. The
+    keyword arguments are passed on to get_align_func.
+
+    With n_workers other than 1, align_many spreads the queries over a
+    pool of processes (one per core if None) in chunks of chunk_size.
+    The graph and its index are put in shared memory once per call, so
+    only the queries and results are sent between processes.
+    """
+
+    def __init__(self, graph, gap_open, score_matrix, gap_extend=None,
+                 n_workers=1, chunk_size=16, **kwargs):
+        self._align_args = ((gap_open, score_matrix, gap_extend), kwargs)
+        self._align = get_align_func(gap_open, score_matrix, gap_extend, **kwargs)
+        self._dtype = np.dtype(kwargs.get("dtype", "float"))
+        self.graph = prepare_graph(graph)
+        self.n_workers = os.cpu_count() if n_workers is None else n_workers
+        self.chunk_size = chunk_size
+
+    def align(self, query):
+        return self._align(self.graph, query)
+
+    def align_many(self, queries):
+        """Align each query, returning arrays instead of tuples
+
+        Gives an array of scores, or a tuple of arrays with one entry per
+        query for each value the aligner returns. Alignments are object
+        arrays of strings, and flags are boolean arrays. Results are in
+        the order of the queries.
+        """
+        if self.n_workers == 1:
+            results = [self.align(query) for query in queries]
+        else:
+            results = self._align_parallel(list(queries))
+        if not results or not isinstance(results[0], tuple):
+            return np.array(results, dtype=self._dtype)
+        return tuple(self._to_array(values) for values in zip(*results))
+
+    def _align_parallel(self, queries):
+        chunks = [queries[start:start+self.chunk_size]
+                  for start in range(0, len(queries), self.chunk_size)]
+        shm, specs = _share_graph(self.graph)
+        try:
+            with Pool(min(self.n_workers, max(1, len(chunks))), initializer=_init_worker,
+                      initargs=(shm.name, specs, self._align_args)) as pool:
+                return [result for chunk in pool.imap(_align_chunk, chunks)
+                        for result in chunk]
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def _to_array(self, values):
+        if isinstance(values[0], str):
+            array = np.empty(len(values), dtype="object")
+            array[:] = values
+            return array
+        if isinstance(values[0], (bool, np.bool_)):
+            return np.array(values, dtype="bool")
+        return np.array(values, dtype=self._dtype)
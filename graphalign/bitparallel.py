@@ -0,0 +1,101 @@
+import numpy as np
+
+from .sequencegraph import get_prev_index, get_longest_depths, naive_graph
+
+
+def _get_peq(query):
+    """Bitmask of the positions of each character in the query"""
+    peq = [0]*(max(query, default=0)+1)
+    for i, c in enumerate(query):
+        peq[c] |= 1 << i
+    return peq
+
+
+def _decode(column, length):
+    """Cell values of a column given as (pv, mv, top, bottom)"""
+    pv, mv, top, _ = column
+    n_bytes = (length+7)//8
+    deltas = np.zeros(length+1, dtype="int")
+    deltas[0] = top
+    for bits, sign in ((pv, 1), (mv, -1)):
+        unpacked = np.unpackbits(np.frombuffer(bits.to_bytes(n_bytes, "little"), dtype="uint8"),
+                                 bitorder="little")
+        deltas[1:] += sign*unpacked[:length].astype("int")
+    return np.cumsum(deltas)
+
+
+def _encode(values):
+    deltas = np.diff(values)
+    pv, mv = (int.from_bytes(np.packbits(bits, bitorder="little").tobytes(), "little")
+              for bits in (deltas > 0, deltas < 0))
+    return (pv, mv, int(values[0]), int(values[-1]))
+
+
+def _merge(columns, length):
+    """Cellwise minimum of the columns of several predecessors"""
+    if len(columns) == 1:
+        return columns[0]
+    return _encode(np.minimum.reduce([_decode(column, length) for column in columns]))
+
+
+def edit_distance(graph, query):
+    """Unit cost global edit distance between a graph and a query sequence
+
+    Myers' bit-parallel algorithm with the query as the pattern in a
+    Python int, so each graph position costs a handful of big int
+    operations regardless of the query length. At positions with several
+    predecessors their columns are decoded and merged cellwise.
+    """
+    graph = naive_graph(graph)
+    length = len(query)
+    peq = _get_peq(query)
+    mask = (1 << length)-1
+    high_bit = 1 << (length-1) if length else 0
+    indptr, indices, is_linear = get_prev_index(graph)
+    kept = set(indices[np.repeat(~is_linear, np.diff(indptr))].tolist())
+    columns = {}
+    column = (mask, 0, 0, length)
+    for row, c in enumerate(graph.sequences, 1):
+        if row-1 in kept:
+            columns[row-1] = column
+        if not is_linear[row]:
+            column = _merge([columns[prev] for prev in indices[indptr[row]:indptr[row+1]]],
+                            length)
+        pv, mv, top, bottom = column
+        if not length:
+            column = (0, 0, top+1, top+1)
+            continue
+        eq = peq[c] if c < len(peq) else 0
+        xv = eq | mv
+        xh = (((eq & pv)+pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        bottom += bool(ph & high_bit)-bool(mh & high_bit)
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+        column = (mh | (~(xv | ph) & mask), ph & xv, top+1, bottom)
+    return column[3]
+
+
+def get_score_bound_func(gap_open, score_matrix, gap_extend=None):
+    """Make a cheap upper bound on the score of aligning a graph and a query
+
+    Every edit costs at least the smaller of the loss of a mismatch and the
+    loss of a gap position compared to half a match, so the edit distance
+    bounds the best score get_align_func can return. If the bound is below
+    what is needed, graph_align does not have to run at all.
+    """
+    if gap_extend is None:
+        gap_extend = gap_open
+    score_matrix = np.asarray(score_matrix)
+    best = score_matrix.max()
+    mismatch = score_matrix[~np.eye(len(score_matrix), dtype="bool")].max(initial=-np.inf)
+    edit_loss = max(min(best-mismatch, best/2-max(gap_open, gap_extend)), 0)
+
+    def score_bound(graph, query):
+        graph = naive_graph(graph)
+        longest = get_longest_depths(get_prev_index(graph))[-1]
+        return best*(longest+len(query))/2-edit_loss*edit_distance(graph, query)
+
+    return score_bound
+
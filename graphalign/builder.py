@@ -1,43 +1,68 @@
 from collections import defaultdict, namedtuple
 from itertools import chain
 import numpy as np
-from .sequencegraph import SequenceGraph
+from .sequencegraph import SequenceGraph, CompactSequenceGraph, NodeMap
+from .needleman_wunch import get_align_func
 from .datastructs import Interval, Position
 from .topological_sort import topological_sort
 import logging
 BuilderStruct = namedtuple("BS", ["nodes", "adj_list"])
+Variant = namedtuple("Variant", ["offset", "ref_length", "alt"])
 
 
 def adj_integrity(func):
+    """Check that the forward and reverse adjacency agree after func
+
+    The check goes through the whole graph, so it is only done for
+    builders in debug mode.
+    """
     def new_func(self, *args, **kwargs):
         ret = func(self, *args, **kwargs)
+        if not self.debug:
+            return ret
         for from_node, to_nodes in self._adj_list.items():
             assert all(from_node in self._reverse_adj_list[to_node]
                        for to_node in to_nodes), (self._adj_list, self._reverse_adj_list)
         for from_node, to_nodes in self._reverse_adj_list.items():
             assert all(from_node in self._adj_list[to_node]
                        for to_node in to_nodes), (self._adj_list, self._reverse_adj_list)
-        assert all(len(v) == len(set(v)) for v in self._adj_list.values())
-        assert all(len(v) == len(set(v)) for v in self._reverse_adj_list.values())
         return ret
     return new_func
 
 
 class GraphBuilder:
+    """Editable graph of node sequences
+
+    Node sequences can be lists or arrays of base codes, and are exported
+    as one uint8 array.
+
+    The edges of each node are kept in dicts used as ordered sets, so
+    that edges are added and removed in constant time. With debug set,
+    the adjacency is checked after every edit.
+
+    The exported SequenceGraph is cached and reused until the graph
+    changes.
+    """
+
+    debug = False
 
     @adj_integrity
-    def __init__(self, nodes={}, adj_list={}):
-        self._nodes = nodes
-        self._adj_list = defaultdict(list, adj_list)
-        self._reverse_adj_list = defaultdict(list)
-        [self._reverse_adj_list[to_node].append(from_node)
-         for from_node, to_nodes in self._adj_list.items()
-         for to_node in to_nodes]
-        print(self._reverse_adj_list)
+    def __init__(self, nodes=None, adj_list={}, debug=False):
+        self.debug = debug
+        self._nodes = {} if nodes is None else nodes
+        self._adj_list = defaultdict(dict, {from_node: dict.fromkeys(to_nodes)
+                                            for from_node, to_nodes in adj_list.items()})
+        self._reverse_adj_list = defaultdict(dict)
+        for from_node, to_nodes in self._adj_list.items():
+            for to_node in to_nodes:
+                self._reverse_adj_list[to_node][from_node] = None
         self._max_node = max(self._nodes) if self._nodes else -1
+        self._export_cache = None
 
     def __eq__(self, other):
-        return self._nodes == other._nodes and self._adj_list == other._adj_list
+        return (self._nodes.keys() == other._nodes.keys() and
+                all(np.array_equal(seq, other._nodes[node_id]) for node_id, seq in self._nodes.items()) and
+                self._adj_list == other._adj_list)
 
     def __repr__(self):
         pass
@@ -48,7 +73,7 @@ class GraphBuilder:
                  for node_id, seq in other._nodes.items()}
         nodes.update(self._nodes)
         adj_list = {node_offset+node_id: [node_offset+n for n in nexts]
-                    for node_id, nexts in other._adj_list}
+                    for node_id, nexts in other._adj_list.items()}
         adj_list.update(self._adj_list)
         return self.__class__(nodes, adj_list)
 
@@ -60,42 +85,48 @@ class GraphBuilder:
             node_id = self._max_node+1
         self._nodes[node_id] = data
         self._max_node = max(node_id, self._max_node)
+        self._export_cache = None
         return node_id
 
     @adj_integrity
     def add_edge(self, from_node, to_node):
-        self._adj_list[from_node].append(to_node)
-        self._reverse_adj_list[to_node].append(from_node)
+        self._export_cache = None
+        self._adj_list[from_node][to_node] = None
+        self._reverse_adj_list[to_node][from_node] = None
 
     @adj_integrity
     def set_edge(self, from_node, to_node):
         logging.info("Setting edge %s to %s", from_node, to_node)
         for node in self._adj_list[from_node]:
-            self._reverse_adj_list[node].remove(from_node)
-        self._adj_list[from_node] = [to_node]
-        self._reverse_adj_list[to_node] = [from_node]
+            del self._reverse_adj_list[node][from_node]
+        self._export_cache = None
+        self._adj_list[from_node] = {to_node: None}
+        self._reverse_adj_list[to_node][from_node] = None
 
     @adj_integrity
     def add_edges(self, from_nodes, to_nodes):
+        from_nodes, to_nodes = (list(from_nodes), list(to_nodes))
         logging.debug("Adding edges: %s -> %s", from_nodes, to_nodes)
+        self._export_cache = None
         for node in from_nodes:
-            self._adj_list[node].extend(n for n in to_nodes if n not in self._adj_list[node])
+            self._adj_list[node].update(dict.fromkeys(to_nodes))
         for node in to_nodes:
-            self._reverse_adj_list[node].extend(n for n in from_nodes if n not in self._reverse_adj_list[node])
+            self._reverse_adj_list[node].update(dict.fromkeys(from_nodes))
 
     @adj_integrity
     def remove_node(self, node_id):
+        self._export_cache = None
         del self._nodes[node_id]
         from_nodes = self._reverse_adj_list[node_id]
         to_nodes = self._adj_list[node_id]
         logging.debug("Removing node %s from lists %s, %s", node_id, from_nodes, to_nodes)
         for from_node in from_nodes:
             assert node_id in self._adj_list[from_node], (from_node, self._adj_list[from_node], node_id)
-            self._adj_list[from_node].remove(node_id)
+            del self._adj_list[from_node][node_id]
 
         for to_node in to_nodes:
             assert node_id in self._reverse_adj_list[to_node], (to_node, self._reverse_adj_list[to_node], node_id)
-            self._reverse_adj_list[to_node].remove(node_id)
+            del self._reverse_adj_list[to_node][node_id]
         del self._adj_list[node_id]
         del self._reverse_adj_list[node_id]
 
@@ -103,23 +134,86 @@ class GraphBuilder:
         return len(self._nodes[node_id])
 
     def add_sequence_graph(self, sequence_graph):
-        seqs = [sequence_graph.sequences[start:end] for start, end in
-                zip(sequence_graph.node_offsets,
-                    chain(sequence_graph.node_offsets, [len(sequence_graph)]))]
-        prev_max = self._max_node
+        node_offsets = list(sequence_graph.node_offsets)
+        seqs = [np.asarray(sequence_graph.sequences[start:end]).tolist() for start, end in
+                zip(node_offsets, chain(node_offsets[1:], [len(sequence_graph.sequences)]))]
+        first_node = self._max_node+1
         [self.add_node(seq) for seq in seqs]
-        [self.add_edge([from_node+prev_max], [to_node+prev_max for to_node in to_nodes])
-         for from_node, to_nodes in sequence_graph._adj_list.items()]
+        [self.add_edge(from_node+first_node, to_node+first_node)
+         for from_node, to_nodes in sequence_graph.adj_list.items()
+         for to_node in to_nodes]
         return self._max_node
 
     def to_sequence_graph(self):
-        node_sequence = topological_sort(self)
+        return self._export()[0]
+
+    def _export(self):
+        """The SequenceGraph of the builder, and the builder node of each of its nodes"""
+        if self._export_cache is None:
+            node_sequence = topological_sort(self)
+            if len(node_sequence) != len(self._nodes):
+                raise ValueError("The graph has a cycle")
+            self._export_cache = self._get_sequence_graph(node_sequence)
+        return self._export_cache
+
+    def _get_sequence_graph(self, node_sequence):
         lookup = {node: i for i, node in enumerate(node_sequence)}
         sequences = [self._nodes[node_id] for node_id in node_sequence]
-        node_offsets = chain([0], np.cumsum([len(seq) for seq in sequences])[:-1])
+        lengths = np.array([len(seq) for seq in sequences], dtype="int")
+        node_offsets = (np.cumsum(lengths)-lengths).tolist()
         adj_list = {lookup[from_node]: [lookup[to] for to in to_nodes]
                     for from_node, to_nodes in self._adj_list.items()}
-        return SequenceGraph(list(chain(sequences)), node_offsets, adj_list)
+        sequences = np.concatenate([np.asarray(seq, dtype="uint8") for seq in sequences] or
+                                   [np.zeros(0, dtype="uint8")])
+        return SequenceGraph(sequences, node_offsets, adj_list), node_sequence
+
+    @adj_integrity
+    def compact(self):
+        """Merge the maximal non-branching paths into single nodes, in O(V+E)
+
+        Each path is merged into its first node. Returns a NodeMap with
+        the new node of each old node id and its offset in it (-1 for ids
+        not in use), for map_interval.
+        """
+        def joins_previous(node):
+            prevs = self._reverse_adj_list.get(node, ())
+            return len(prevs) == 1 and len(self._adj_list.get(next(iter(prevs)), ())) == 1
+
+        node_map = NodeMap(np.full(self.size(), -1), np.full(self.size(), -1))
+        for head in [node for node in self._nodes if not joins_previous(node)]:
+            node_map.nodes[head], node_map.offsets[head] = (head, 0)
+            path = [head]
+            while len(self._adj_list.get(path[-1], ())) == 1:
+                next_node = next(iter(self._adj_list[path[-1]]))
+                if len(self._reverse_adj_list[next_node]) != 1:
+                    break
+                path.append(next_node)
+            if len(path) == 1:
+                continue
+            sequences = [self._nodes[node] for node in path]
+            lengths = np.array([len(seq) for seq in sequences])
+            node_map.nodes[path[1:]] = head
+            node_map.offsets[path[1:]] = np.cumsum(lengths)[:-1]
+            if any(isinstance(seq, np.ndarray) for seq in sequences):
+                self._nodes[head] = np.concatenate(sequences)
+            else:
+                self._nodes[head] = list(chain.from_iterable(sequences))
+            successors = self._adj_list[path[-1]]
+            for node in successors:
+                del self._reverse_adj_list[node][path[-1]]
+                self._reverse_adj_list[node][head] = None
+            self._adj_list[head] = successors
+            for node in path[1:]:
+                del self._nodes[node]
+                del self._reverse_adj_list[node]
+                if node != path[-1]:
+                    del self._adj_list[node]
+            del self._adj_list[path[-1]]
+        self._export_cache = None
+        return node_map
+
+    def to_compact_sequence_graph(self):
+        return CompactSequenceGraph.from_graph(self.to_sequence_graph())
 
     def to_struct(self):
         return BuilderStruct(self._nodes, {k: list(sorted(v)) for k, v in self._adj_list.items() if v})
@@ -130,7 +224,7 @@ class GraphBuilder:
             if not self._adj_list[node_id]:
                 continue
             topology[tuple(seq)].append(
-                tuple(sorted(self._nodes[n] for n in self._adj_list[node_id])))
+                tuple(sorted(tuple(self._nodes[n]) for n in self._adj_list[node_id])))
         for v in topology.values():
             v.sort()
         return topology
@@ -146,11 +240,44 @@ class GraphBuilder:
         return next_node
 
     def add_snps(self, node_id, offsets, seqs):
-        cur_offset = 0
-        for offset, snp in zip(offsets, seqs):
-            node_id = self.add_snp(Position(node_id, offset-cur_offset),
-                                   snp)
-            cur_offset = offset+1
+        self.add_variants(node_id, [Variant(offset, 1, [snp]) for offset, snp in zip(offsets, seqs)])
+
+    def add_variants(self, node_id, variants):
+        """Add many variants of one node in a single pass
+
+        Variants are (offset, ref_length, alt), so a SNP has ref_length 1,
+        a deletion an empty alt and an insertion, before offset, ref_length
+        0. The node is cut at all variant ends at once, and the pieces and
+        the variant nodes are added in order. Returns the nodes of the
+        reference sequence.
+        """
+        seq = self._nodes[node_id]
+        assert all(0 <= v.offset <= v.offset+v.ref_length <= len(seq) for v in variants), variants
+        splits = sorted({pos for v in variants for pos in (v.offset, v.offset+v.ref_length)
+                         if 0 < pos < len(seq)})
+        bounds = [0] + splits + [len(seq)]
+        predecessors = list(self._reverse_adj_list[node_id])
+        successors = list(self._adj_list[node_id])
+        self._nodes[node_id] = seq[:bounds[1]]
+        segments = [node_id] + [self.add_node(seq[start:end])
+                                for start, end in zip(bounds[1:-1], bounds[2:])]
+        if len(segments) > 1:
+            self.set_edge(node_id, segments[1])
+            for from_node, to_node in zip(segments[1:-1], segments[2:]):
+                self.add_edge(from_node, to_node)
+            self.add_edges(segments[-1:], successors)
+        index = {pos: i for i, pos in enumerate(bounds)}
+        for variant in variants:
+            start, end = (index[variant.offset], index[variant.offset+variant.ref_length])
+            from_nodes = segments[start-1:start] if start > 0 else predecessors
+            to_nodes = segments[end:end+1] if end < len(segments) else successors
+            if len(variant.alt):
+                alt_node = self.add_node(list(variant.alt))
+                self.add_edges(from_nodes, [alt_node])
+                self.add_edges([alt_node], to_nodes)
+            else:
+                self.add_edges(from_nodes, to_nodes)
+        return segments
 
     def add_deletion(self, interval):
         start_node = interval.nodes[0]
@@ -184,14 +311,14 @@ class GraphBuilder:
         """Split node before position"""
         # Update seq
         orig_seq = self._nodes[node_id]
+        successors = list(self._adj_list[node_id])
         self._nodes[node_id] = orig_seq[:split]
-        self._max_node += 1
-        self._nodes[self._max_node] = orig_seq[split:]
+        new_node = self.add_node(orig_seq[split:])
 
         # Update edges
-        self.add_edges([self._max_node], self._adj_list[node_id])
-        self.set_edge(node_id, self._max_node)
-        return self._max_node
+        self.set_edge(node_id, new_node)
+        self.add_edges([new_node], successors)
+        return new_node
 
     def _copy_node(self, node_id, seq):
         new_id = self.add_node(seq)
@@ -241,13 +368,18 @@ class GraphMerger(GraphBuilder):
         self.add_edges([node_a], self._adj_list[node_b])
         self.add_edges(self._reverse_adj_list[node_b], [node_a])
         self.remove_node(node_b)
-        tmp = [(i, pair[1])
-               for i, pair in enumerate(zip(seq_a, seq_b))
-               if pair[0] != pair[1]]
-        if not tmp:
-            return
-        offsets, seqs = zip(*tmp)
-        self.add_snps(node_a, offsets, seqs)
+        # Runs of mismatches become one variant, so that seq_b stays a path
+        variants = []
+        for i, (a, b) in enumerate(zip(seq_a, seq_b)):
+            if a == b:
+                continue
+            if variants and variants[-1].offset+variants[-1].ref_length == i:
+                variants[-1].alt.append(b)
+                variants[-1] = variants[-1]._replace(ref_length=variants[-1].ref_length+1)
+            else:
+                variants.append(Variant(i, 1, [b]))
+        if variants:
+            self.add_variants(node_a, variants)
 
     def _merge_paths(self, path_a, path_b):
         logging.info("Merging paths %s and %s", path_a, path_b)
@@ -264,13 +396,81 @@ class GraphMerger(GraphBuilder):
         self._merge_paths(new_path_a, new_path_b)
 
 
+def map_interval(interval, node_map):
+    """The interval in a graph compacted with the given NodeMap"""
+    nodes = [int(node_map.nodes[node]) for node in interval.nodes]
+    return Interval(interval.start+int(node_map.offsets[interval.nodes[0]]),
+                    interval.end+int(node_map.offsets[interval.nodes[-1]]),
+                    [node for i, node in enumerate(nodes) if i == 0 or node != nodes[i-1]])
+
+
 def merge_graphs(graph_a, graph_b, intervals_a, intervals_b):
     builder = GraphMerger()
-    b_node_offset = builder.add_sequence_graph(graph_a)
+    b_node_offset = builder.add_sequence_graph(graph_a)+1
     builder.add_sequence_graph(graph_b)
     intervals_b = [Interval(i.start, i.end, [node+b_node_offset for node in i.nodes])
                    for i in intervals_b]
-    for interval_pair in reversed(zip(intervals_a, intervals_b)):
+    for interval_pair in reversed(list(zip(intervals_a, intervals_b))):
         builder.merge_intervals(*interval_pair)
 
     return builder.to_sequence_graph()
+
+
+def _get_matched_intervals(path, node_offsets, node_order):
+    """Pairs of graph and sequence intervals aligned without gaps in a traceback path
+
+    The graph intervals are in terms of the builder nodes in node_order,
+    and the sequence intervals are (start, end) in the sequence.
+    """
+    runs = []
+    for (i, j), (next_i, next_j) in zip(path[:-1], path[1:]):
+        if next_i == i or next_j == j:
+            continue
+        if runs and runs[-1][0][-1] == i-1 and runs[-1][1][-1] == j:
+            runs[-1][0].append(next_i-1)
+            runs[-1][1].append(next_j)
+        else:
+            runs.append(([next_i-1], [next_j-1, next_j]))
+    pairs = []
+    for positions, columns in runs:
+        nodes = np.searchsorted(node_offsets, positions, side="right")-1
+        first = np.flatnonzero(np.diff(nodes, prepend=-1))
+        pairs.append((Interval(int(positions[0]-node_offsets[nodes[0]]),
+                               int(positions[-1]-node_offsets[nodes[-1]]+1),
+                               [node_order[node] for node in nodes[first]]),
+                      (columns[0], columns[-1])))
+    return pairs
+
+
+def build_progressive_graph(sequences, gap_open, score_matrix, gap_extend=None):
+    """Build a graph from sequences by merging each into the graph of the ones before
+
+    Like partial order alignment, each sequence is aligned to the current
+    graph with graph_align, and the parts aligned without gaps are merged
+    into it with merge_intervals, leaving the gaps as new paths. Returns
+    the GraphMerger.
+    """
+    align = get_align_func(gap_open, score_matrix, gap_extend, return_path=True)
+    sequences = iter(sequences)
+    builder = GraphMerger({0: list(next(sequences))})
+    for sequence in sequences:
+        graph, node_order = builder._export()
+        path, _ = align(graph, list(sequence))
+        node_offsets = np.fromiter(graph.node_offsets, dtype="int")
+        pairs = _get_matched_intervals(path, node_offsets, node_order)
+        sequence_node = builder.add_node(list(sequence))
+        for interval, (start, end) in reversed(pairs):
+            builder.merge_intervals(interval, Interval(start, end, [sequence_node]))
+    return builder
+
+
+if __name__ == "__main__":
+    import time
+    for n_variants in (1000, 10000, 100000):
+        rng = np.random.default_rng(0)
+        builder = GraphBuilder({node: rng.integers(0, 4, 100).tolist() for node in range(n_variants)},
+                               {node: [node+1] for node in range(n_variants-1)})
+        t = time.perf_counter()
+        for node in range(n_variants):
+            builder.add_snp(Position(node, 50), int(rng.integers(0, 4)))
+        print("%s variants: %.2fs" % (n_variants, time.perf_counter()-t))
@@ -0,0 +1,206 @@
+from collections import namedtuple
+from itertools import groupby
+import logging
+import time
+import numpy as np
+
+from .builder import GraphBuilder, Variant
+from .gfa import _write_segment, _write_link
+from .sequencegraph import _ENCODE
+
+Progress = namedtuple("Progress", ["contig", "bases", "variants", "seconds"])
+
+
+def _encode_bases(sequence, unknown_base, contig, offset):
+    """uint8 codes of ACGT bases, with other bases such as N set to unknown_base
+
+    Without an unknown_base, other bases raise a ValueError giving their
+    1-based position as contig:position, where sequence starts at offset.
+    """
+    codes = _ENCODE[np.frombuffer(sequence, dtype="uint8")]
+    unknown = codes == 255
+    if np.any(unknown):
+        if unknown_base is None:
+            first = int(np.argmax(unknown))
+            raise ValueError("Unsupported base %s at %s:%s" % (
+                chr(sequence[first]), contig, offset+first+1))
+        codes[unknown] = unknown_base
+    return codes
+
+
+def read_fasta(filename, chunk_size=1 << 20, unknown_base=None):
+    """Chunks of about chunk_size bases of each contig, as (name, uint8 codes)
+
+    Bases other than ACGT, such as N runs, are replaced by the code
+    unknown_base, or raise a ValueError giving the contig and position.
+    """
+    name = None
+    lines = []
+    size = offset = 0
+    with open(filename, "rb") as f:
+        for line in f:
+            line = line.rstrip()
+            if line.startswith(b">"):
+                if lines:
+                    yield name, _encode_bases(b"".join(lines), unknown_base, name, offset)
+                name = line[1:].split()[0].decode()
+                lines, size, offset = ([], 0, 0)
+                continue
+            lines.append(line)
+            size += len(line)
+            if size >= chunk_size:
+                yield name, _encode_bases(b"".join(lines), unknown_base, name, offset)
+                lines, size, offset = ([], 0, offset+size)
+    if lines:
+        yield name, _encode_bases(b"".join(lines), unknown_base, name, offset)
+
+
+def _normalize(pos, ref, alt):
+    """Strip the bases shared by ref and alt, returning the position and the rest"""
+    while ref and alt and ref[-1] == alt[-1]:
+        ref, alt = (ref[:-1], alt[:-1])
+    while ref and alt and ref[0] == alt[0]:
+        ref, alt, pos = (ref[1:], alt[1:], pos+1)
+    return pos, ref, alt
+
+
+def _read_vcf_records(filename, unknown_base=None):
+    """Records of a VCF file as (chrom, 0-based POS, Variant, trimmed REF codes)
+
+    Raises a ValueError when the records of a chromosome are not sorted
+    by position.
+    """
+    last = (None, 0)
+    with open(filename, "rb") as f:
+        for line in f:
+            if line.startswith(b"#"):
+                continue
+            chrom, pos, _, ref, alts = line.split(b"\t", 5)[:5]
+            chrom, pos = (chrom.decode(), int(pos)-1)
+            if chrom == last[0] and pos < last[1]:
+                raise ValueError("VCF is not sorted: %s:%s comes after %s:%s" % (
+                    chrom, pos+1, chrom, last[1]+1))
+            last = (chrom, pos)
+            for alt in alts.split(b","):
+                if alt in (b".", b"*") or alt.startswith(b"<") or b"[" in alt or b"]" in alt:
+                    continue
+                offset, trimmed_ref, trimmed_alt = _normalize(pos, ref.upper(), alt.upper())
+                if trimmed_ref or trimmed_alt:
+                    yield chrom, pos, Variant(offset, len(trimmed_ref), _encode_bases(
+                        trimmed_alt, unknown_base, chrom, offset).tolist()), \
+                        _encode_bases(trimmed_ref, unknown_base, chrom, offset)
+
+
+def read_vcf(filename, unknown_base=None):
+    """Variants of a VCF file as (chrom, Variant) with 0-based offsets in the contig
+
+    Each ALT allele is a separate Variant, trimmed to the bases that
+    differ from REF. Symbolic, breakend and missing alleles are skipped.
+    Bases other than ACGT are handled as in read_fasta, and the records
+    of each chromosome must be sorted by position.
+    """
+    for chrom, _, variant, _ in _read_vcf_records(filename, unknown_base):
+        yield chrom, variant
+
+
+def _get_regions(chunks, records, region_size, contig):
+    """Split a contig in regions of about region_size bases with their variants
+
+    records are (POS, Variant, REF) sorted by POS. Regions are extended
+    until they end with a reference base that no variant touches, so the
+    regions can simply be chained together, and each REF is checked
+    against the reference. Yields the start, the reference and the
+    variants of each region, with offsets relative to the region start.
+    """
+    reference = np.zeros(0, dtype="uint8")
+    start = 0
+    record = next(records, None)
+    while True:
+        end = start+region_size
+        region_records = []
+        # Normalized variants can start after POS, so regions are cut by
+        # POS to keep later records out of the regions before them
+        while record is not None and record[0] <= end:
+            region_records.append(record)
+            end = max(end, record[1].offset+record[1].ref_length+1)
+            record = next(records, None)
+        pieces = [reference]
+        size = len(reference)
+        while size < end-start:
+            chunk = next(chunks, None)
+            if chunk is None:
+                break
+            pieces.append(chunk)
+            size += len(chunk)
+        reference = np.concatenate(pieces)
+        region_length = min(end-start, len(reference))
+        region_variants = []
+        for _, variant, ref in region_records:
+            offset = variant.offset-start
+            if offset+variant.ref_length > region_length:
+                raise ValueError("Variant beyond the end of the reference at %s:%s" % (
+                    contig, variant.offset+1))
+            if not np.array_equal(reference[offset:offset+variant.ref_length], ref):
+                raise ValueError("VCF REF does not match the reference at %s:%s" % (
+                    contig, variant.offset+1))
+            region_variants.append(variant._replace(offset=offset))
+        if not region_length:
+            if record is not None:
+                raise ValueError("Variant beyond the end of the reference at %s:%s" % (
+                    contig, record[1].offset+1))
+            return
+        region_variants.sort(key=lambda v: v.offset)
+        yield start, reference[:region_length], region_variants
+        reference = reference[region_length:]
+        start += region_length
+
+
+def construct_graph(fasta_filename, vcf_filename, gfa_filename,
+                    region_size=1 << 20, progress=None, unknown_base=None):
+    """Build a variation graph from a reference and a sorted VCF, written as GFA
+
+    The reference is read in chunks, and one region at a time is built
+    with GraphBuilder.add_variants and written out, so memory use depends
+    on the region size, not the contig size. progress, if given, is called
+    with a Progress after each region. Returns the final Progress.
+
+    Bases other than ACGT, such as N runs, raise a ValueError giving the
+    contig and position unless unknown_base gives a code to replace them
+    with. VCF records must be sorted and their REF match the reference.
+    """
+    vcf_contigs = groupby(_read_vcf_records(vcf_filename, unknown_base),
+                          key=lambda record: record[0])
+    vcf_contig = next(vcf_contigs, None)
+    bases = n_variants = n_nodes = 0
+    t = time.perf_counter()
+    with open(gfa_filename, "w") as f:
+        f.write("H\tVN:Z:1.0\n")
+        for contig, chunks in groupby(read_fasta(fasta_filename, unknown_base=unknown_base),
+                                      key=lambda record: record[0]):
+            has_variants = vcf_contig is not None and vcf_contig[0] == contig
+            records = (record[1:] for record in vcf_contig[1]) if has_variants else iter(())
+            last_node = None
+            for start, reference, region_variants in _get_regions(
+                    (chunk for _, chunk in chunks), records, region_size, contig):
+                builder = GraphBuilder({0: reference}, {})
+                segments = builder.add_variants(0, region_variants)
+                for node, sequence in builder._nodes.items():
+                    _write_segment(f, n_nodes+node+1, sequence)
+                for from_node, to_nodes in builder._adj_list.items():
+                    for to_node in to_nodes:
+                        _write_link(f, n_nodes+from_node+1, n_nodes+to_node+1)
+                if last_node is not None:
+                    _write_link(f, last_node, n_nodes+1)
+                last_node = n_nodes+segments[-1]+1
+                n_nodes += builder.size()
+                bases += len(reference)
+                n_variants += len(region_variants)
+                if progress is not None:
+                    progress(Progress(contig, bases, n_variants, time.perf_counter()-t))
+            if has_variants:
+                vcf_contig = next(vcf_contigs, None)
+            logging.info("Built %s: %s bases and %s variants, %.0f bases/s", contig, bases,
+                         n_variants, bases/max(time.perf_counter()-t, 1e-9))
+    if vcf_contig is not None:
+        raise ValueError("VCF contig %s is not in the reference, or not in its order" % vcf_contig[0])
+    return Progress(None, bases, n_variants, time.perf_counter()-t)
@@ -0,0 +1,125 @@
+from collections import namedtuple
+import numpy as np
+
+from .builder import GraphBuilder
+from .sequencegraph import SequenceGraph, _ENCODE
+from .topological_sort import topological_sort
+
+GFA = namedtuple("GFA", ["graph", "segment_names", "paths"])
+
+_DECODE = np.frombuffer(b"ACGT", dtype="uint8")
+
+
+def _encode(sequence):
+    codes = _ENCODE[np.frombuffer(sequence, dtype="uint8")]
+    if np.any(codes == 255):
+        raise ValueError("Unsupported character in segment sequence")
+    return codes
+
+
+def _write_segment(f, name, sequence):
+    f.write("S\t%s\t%s\n" % (name, _DECODE[np.asarray(sequence, dtype="int")].tobytes().decode()))
+
+
+def _write_link(f, from_name, to_name):
+    f.write("L\t%s\t+\t%s\t+\t0M\n" % (from_name, to_name))
+
+
+def _check_overlap(overlap):
+    if overlap not in (b"*", b"0M"):
+        raise ValueError("Overlapping links are not supported: %s" % overlap.decode())
+
+
+def _parse_gfa(filename, buffer_size):
+    """Segments, edges and paths of a GFA v1 file, with segments numbered by first use
+
+    The file is read line by line through a buffer of buffer_size bytes,
+    and each segment sequence is encoded to a uint8 array as it is read.
+    Only forward strand links and paths without overlaps are supported.
+    """
+    ids = {}
+    sequences = []
+    adj_list = {}
+    paths = {}
+
+    def get_id(name):
+        if name not in ids:
+            ids[name] = len(ids)
+            sequences.append(None)
+        return ids[name]
+
+    with open(filename, "rb", buffering=buffer_size) as f:
+        for line in f:
+            fields = line.rstrip(b"\r\n").split(b"\t")
+            if fields[0] == b"S":
+                sequences[get_id(fields[1])] = _encode(fields[2])
+            elif fields[0] == b"L":
+                if fields[2] != b"+" or fields[4] != b"+":
+                    raise ValueError("Reverse strand links are not supported: %s" % line.decode())
+                _check_overlap(fields[5])
+                adj_list.setdefault(get_id(fields[1]), []).append(get_id(fields[3]))
+            elif fields[0] == b"P":
+                steps = fields[2].split(b",")
+                if any(step[-1:] != b"+" for step in steps):
+                    raise ValueError("Reverse strand paths are not supported: %s" % fields[1].decode())
+                if len(fields) > 3:
+                    [_check_overlap(overlap) for overlap in fields[3].split(b",")]
+                paths[fields[1].decode()] = [get_id(step[:-1]) for step in steps]
+    names = [name.decode() for name in ids]
+    missing = [name for name, sequence in zip(names, sequences) if sequence is None]
+    if missing:
+        raise ValueError("Links to missing segments: %s" % missing[:10])
+    return sequences, adj_list, names, paths
+
+
+def read_gfa_builder(filename, buffer_size=1 << 20):
+    """Read a GFA v1 file into a GraphBuilder with nodes numbered in file order
+
+    The node sequences are the uint8 arrays the segments were encoded to.
+    """
+    sequences, adj_list, names, paths = _parse_gfa(filename, buffer_size)
+    builder = GraphBuilder(dict(enumerate(sequences)), adj_list)
+    return GFA(builder, names, paths)
+
+
+def read_gfa(filename, buffer_size=1 << 20):
+    """Read a GFA v1 file into a SequenceGraph
+
+    Nodes are ordered topologically, and segment_names and paths are given
+    in terms of the graph's nodes. The sequences are a single uint8 array.
+    """
+    sequences, adj_list, names, paths = _parse_gfa(filename, buffer_size)
+    order = topological_sort(GraphBuilder(dict(enumerate(sequences)), adj_list))
+    lookup = np.empty(len(sequences), dtype="int")
+    lookup[order] = np.arange(len(order))
+    lengths = np.array([len(sequences[node]) for node in order], dtype="int")
+    graph = SequenceGraph(
+        np.concatenate([sequences[node] for node in order] or [np.zeros(0, dtype="uint8")]),
+        (np.cumsum(lengths)-lengths).tolist(),
+        {int(lookup[node]): lookup[to_nodes].tolist() for node, to_nodes in adj_list.items()})
+    return GFA(graph,
+               [names[node] for node in order],
+               {name: lookup[path].tolist() for name, path in paths.items()})
+
+
+def write_gfa(graph, filename, segment_names=None, paths=None):
+    """Write a SequenceGraph or GraphBuilder as GFA v1, one line at a time
+
+    Segments are named by segment_names, or numbered from 1, and paths
+    maps path names to lists of nodes.
+    """
+    if isinstance(graph, GraphBuilder):
+        graph = graph.to_sequence_graph()
+    node_offsets = [int(offset) for offset in graph.node_offsets]
+    node_ends = node_offsets[1:] + [len(graph.sequences)]
+    if segment_names is None:
+        segment_names = [str(node+1) for node in range(len(node_offsets))]
+    with open(filename, "w") as f:
+        f.write("H\tVN:Z:1.0\n")
+        for name, start, end in zip(segment_names, node_offsets, node_ends):
+            _write_segment(f, name, graph.sequences[start:end])
+        for from_node, to_nodes in graph.adj_list.items():
+            for to_node in to_nodes:
+                _write_link(f, segment_names[from_node], segment_names[to_node])
+        for name, path in (paths or {}).items():
+            f.write("P\t%s\t%s\t*\n" % (name, ",".join(segment_names[node]+"+" for node in path)))
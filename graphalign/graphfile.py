@@ -0,0 +1,91 @@
+import os
+import struct
+import numpy as np
+
+from .sequencegraph import CompactSequenceGraph
+
+MAGIC = b"GRAPHALN"
+VERSION = 1
+ALIGNMENT = 64
+_HEADER = struct.Struct("<8sII")
+_ENTRY = struct.Struct("<24s8sQQ")
+GRAPH_ARRAYS = ("sequences", "node_offsets", "adj_indptr", "adj_indices",
+                "rev_indptr", "rev_indices")
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT)*ALIGNMENT
+
+
+def _check_extra_array(name, array):
+    if name in GRAPH_ARRAYS:
+        raise ValueError("Extra array name %s is used by the graph" % name)
+    if len(name.encode()) > 24:
+        raise ValueError("Extra array name %s is longer than 24 bytes" % name)
+    if array.dtype.hasobject or len(array.dtype.str.encode()) > 8:
+        raise ValueError("Unsupported dtype %s for extra array %s" % (array.dtype, name))
+    if array.ndim != 1:
+        raise ValueError("Extra array %s has %s dimensions, not 1" % (name, array.ndim))
+
+
+def save_graph(graph, filename, **extra_arrays):
+    """Write a graph and any extra named arrays to a binary graph file
+
+    The file starts with a magic string, the format version and a table
+    of (name, dtype, length, offset) for each array, and the arrays follow
+    at 64 byte aligned offsets so that load_graph can map them directly.
+    Extra arrays must be one-dimensional with a plain dtype, and their
+    names at most 24 bytes and different from the graph's arrays.
+    """
+    if not isinstance(graph, CompactSequenceGraph):
+        graph = CompactSequenceGraph.from_graph(graph)
+    arrays = [(name, getattr(graph, name)) for name in GRAPH_ARRAYS]
+    arrays += [(name, np.ascontiguousarray(array)) for name, array in extra_arrays.items()]
+    for name, array in arrays[len(GRAPH_ARRAYS):]:
+        _check_extra_array(name, array)
+    offset = _aligned(_HEADER.size+_ENTRY.size*len(arrays))
+    entries = []
+    for name, array in arrays:
+        entries.append(_ENTRY.pack(name.encode(), array.dtype.str.encode(), array.size, offset))
+        offset = _aligned(offset+array.nbytes)
+    with open(filename, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(arrays)))
+        f.write(b"".join(entries))
+        for entry, (_, array) in zip(entries, arrays):
+            f.seek(_ENTRY.unpack(entry)[3])
+            f.write(array.tobytes())
+        f.truncate(offset)
+
+
+def load_graph(filename):
+    """Map a binary graph file, returning the graph and a dict of extra arrays
+
+    The arrays are read-only memory maps, so loading takes no time and
+    processes loading the same file share its pages in the page cache.
+    """
+    file_size = os.path.getsize(filename)
+    with open(filename, "rb") as f:
+        try:
+            magic, version, n_arrays = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != MAGIC:
+                raise ValueError("%s is not a graph file" % filename)
+            if version != VERSION:
+                raise ValueError("Unsupported graph file version %s in %s" % (version, filename))
+            entries = [_ENTRY.unpack(f.read(_ENTRY.size)) for _ in range(n_arrays)]
+        except struct.error:
+            raise ValueError("Truncated graph file %s" % filename)
+    arrays = {}
+    for name, dtype, size, offset in entries:
+        name, dtype = (name.rstrip(b"\0").decode(), np.dtype(dtype.rstrip(b"\0").decode()))
+        if name in arrays:
+            raise ValueError("Duplicate array %s in %s" % (name, filename))
+        if offset+size*dtype.itemsize > file_size:
+            raise ValueError("Truncated graph file %s" % filename)
+        if size:
+            arrays[name] = np.memmap(filename, dtype=dtype, mode="r", offset=offset, shape=(size,))
+        else:
+            arrays[name] = np.zeros(0, dtype=dtype)
+    if any(name not in arrays for name in GRAPH_ARRAYS):
+        raise ValueError("Graph arrays missing from %s" % filename)
+    graph = CompactSequenceGraph(*(arrays.pop(name) for name in GRAPH_ARRAYS))
+    return graph, arrays
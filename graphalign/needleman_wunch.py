@@ -2,7 +2,8 @@ import numpy as np
 from collections import namedtuple
 from itertools import chain
 
-from .sequencegraph import get_prev_func, naive_graph
+from .sequencegraph import get_prev_index, get_prevs, get_shortest_depths, naive_graph
+from .wavefront import get_wavefront_func
 
 
 Alphabet = namedtuple("Alphabet", ["to_str", "to_num"])
@@ -11,6 +12,9 @@ Alphabet = namedtuple("Alphabet", ["to_str", "to_num"])
 _dna_chars = ["A", "C", "G", "T"]
 DNAAlphabet = Alphabet(_dna_chars, {c: i for i, c in enumerate(_dna_chars)})
 BackTrack = namedtuple("BackTrack", ["offset_a", "offset_b"])
+Row = namedtuple("Row", ["offset", "values"])
+
+PreparedGraph = namedtuple("PreparedGraph", ["graph", "prev_index", "last_use"])
 
 
 def get_score_mat(mismatch_score, alphabet_size=4):
@@ -20,98 +24,401 @@ def get_score_mat(mismatch_score, alphabet_size=4):
     return scores
 
 
+# Traceback codes keep the move in the low bits and the slot of the
+# predecessor (in the predecessor lists of the cell) in the high bits
+MOVE_BITS = 3
+DIAG, UP, LEFT, FROM_A, FROM_B = range(5)
+OPEN, EXTEND = range(2)
+
+
+def _encode(moves, slots):
+    return moves | (slots << MOVE_BITS)
+
+
+def _decode(code):
+    return code & ((1 << MOVE_BITS)-1), code >> MOVE_BITS
+
+
+def prepare_graph(graph):
+    """Index a graph once for aligning it as graph_a many times
+
+    last_use[r] is the last row that needs row r as a predecessor.
+    """
+    if isinstance(graph, PreparedGraph):
+        return graph
+    graph = naive_graph(graph)
+    graph = graph._replace(node_offsets=np.fromiter(graph.node_offsets, dtype="int"))
+    prev_index = get_prev_index(graph)
+    indptr, indices, _ = prev_index
+    last_use = np.arange(len(indptr)-1)
+    np.maximum.at(last_use, indices, np.repeat(last_use, np.diff(indptr)))
+    return PreparedGraph(graph, prev_index, last_use)
+
+
 def get_align_func(gap_open, score_matrix, gap_extend=None,
-                   use_graphs=True, return_seq=False):
+                   use_graphs=True, return_seq=False, low_memory=False,
+                   dtype="float", band=None, adaptive_band=False, x_drop=None,
+                   mode="dp", return_path=False):
+    """Make a global aligner for sequences or SequenceGraphs
+
+    With return_seq the aligner returns (alignment_a, alignment_b, score),
+    otherwise just the score. seq_a can also be the result of prepare_graph,
+    to index a graph only once. low_memory keeps only sqrt(len_a) checkpoint
+    rows and recomputes them for the traceback. dtype is used for all
+    scores, and integer dtypes need integer scores.
+
+    band restricts each row to band columns on either side of the line
+    from the start to the end of the matrix (or of the best cell of the
+    previous rows with adaptive_band). A banded aligner also returns
+    whether the optimum may have been cut off by the band, which is
+    flagged when a path leaving the band could still reach the score, or
+    when the traceback touches the edge of the band.
+
+    x_drop prunes cells scoring more than x_drop below the best score seen
+    so far, and stops once a whole row is pruned. It is only available
+    for scores, and the aligner also returns whether it was aborted, in
+    which case the score is negative infinity. The flags come after the
+    score, cut_off first.
+
+    mode="wfa" uses the wavefront engine instead of dynamic programming,
+    which is much faster for near-identical sequences. It gives the same
+    scores, but does not support any of the options above.
+    """
     if gap_extend is None:
         gap_extend = gap_open
+    if mode == "wfa":
+        if return_seq or return_path or low_memory or band is not None or x_drop is not None:
+            raise ValueError("mode='wfa' only supports aligning for scores")
+        wavefront_align = get_wavefront_func(gap_open, score_matrix, gap_extend)
+        dtype = np.dtype(dtype)
+
+        def wfa_align(seq_a, seq_b):
+            if isinstance(seq_a, PreparedGraph):
+                seq_a = seq_a.graph
+            return dtype.type(wavefront_align(naive_graph(seq_a), naive_graph(seq_b)))
+
+        return wfa_align
+    if mode != "dp":
+        raise ValueError("Unknown alignment mode %s" % mode)
+    if x_drop is not None and (return_seq or return_path):
+        raise ValueError("x_drop is only supported when aligning for scores")
+    dtype = np.dtype(dtype)
+    if dtype.kind == "f":
+        neg_inf = -np.inf
+    else:
+        # Leave headroom below the sentinel so adding a penalty to it
+        # cannot wrap around before it is clamped back
+        neg_inf = np.iinfo(dtype).min // 2
+        if not np.array_equal(np.asarray(score_matrix).astype(dtype), score_matrix) or \
+           dtype.type(gap_open) != gap_open or dtype.type(gap_extend) != gap_extend:
+            raise ValueError("Scores must be integers to use %s" % dtype)
+    score_matrix = np.asarray(score_matrix).astype(dtype)
+
+    def get_profile(seq_b):
+        """Scores of each character against each position of seq_b
+
+        Row i of the alignment looks up profile[seq_a[i-1]], so the full
+        len_a x len_b score matrix is never built.
+        """
+        return score_matrix[:, np.asarray(seq_b, dtype="int")]
 
-    def get_comb_scores(seq_a, seq_b):
-        return np.array([[score_matrix[c_a][c_b] for c_b in seq_b] for c_a in seq_a])
+    def check_range(len_a, len_b):
+        """Make sure no reachable score overflows an integer dtype"""
+        if dtype.kind == "f":
+            return
+        highest = max(score_matrix.max(), 0)*min(len_a, len_b)
+        lowest = 2*min(gap_open, 0)+min(gap_open, gap_extend, 0)*(len_a+len_b)
+        if highest > np.iinfo(dtype).max or lowest <= neg_inf:
+            raise OverflowError("Alignment of %s x %s positions can overflow %s" % (
+                len_a, len_b, dtype))
 
     def init_matrices(len_a, len_b):
         # TODO: Set gap penalty for shortest path
-        matrix = np.zeros((len_a+1, len_b+1))
-        open_matrix_a = np.zeros((len_a+1, len_b+1))
-        open_matrix_b = np.zeros((len_a+1, len_b+1))
+        matrix = np.zeros((len_a+1, len_b+1), dtype=dtype)
+        open_matrix_a = np.zeros((len_a+1, len_b+1), dtype=dtype)
+        open_matrix_b = np.zeros((len_a+1, len_b+1), dtype=dtype)
         matrix[1:, 0] = gap_open+gap_extend*np.arange(len_a)
         open_matrix_a[1:, 0] = gap_open+gap_extend*np.arange(len_a)
         open_matrix_b[0, 1:] = gap_open+gap_extend*np.arange(len_b)
         matrix[0, 1:] = gap_open+gap_extend*np.arange(len_b)
-        open_matrix_a[0, :] = -100
-        open_matrix_b[:, 0] = -100
+        open_matrix_a[0, :] = neg_inf
+        open_matrix_b[:, 0] = neg_inf
         return matrix, open_matrix_a, open_matrix_b
 
+    def init_row(i, lo, hi, depths_a, depths_b):
+        """Row i over columns lo..hi-1, with the borders of the matrices set
+
+        The first row and column are scored as a gap along the shortest
+        path to each position, with depths_a and depths_b the path lengths.
+        """
+        scores = np.zeros((3, hi-lo), dtype=dtype)
+        if i == 0:
+            depths = depths_b[lo:hi]
+            scores[0] = np.where(depths > 0, gap_open+gap_extend*(depths-1), 0)
+            scores[2] = scores[0]
+            scores[1] = neg_inf
+        elif lo == 0:
+            scores[:2, 0] = gap_open+gap_extend*(depths_a[i]-1)
+        if lo == 0:
+            scores[2, 0] = neg_inf
+        return Row(lo, scores)
+
+    def gather(row, k, cols):
+        """Scores of matrix k at cols, negative infinity outside the row"""
+        idx = cols - row.offset
+        inside = (idx >= 0) & (idx < row.values.shape[1])
+        return np.where(inside, row.values[k][np.where(inside, idx, 0)], neg_inf)
+
+    def fill_row(i, prev_is, prev_rows, row, row_scores, prev_b, linear_b,
+                 backtrack=None):
+        """Fill row i from its predecessor rows, vectorized over seq_b
+
+        Rows hold the (matrix, open_a, open_b) scores over a window of
+        columns, and cells outside a window count as negative infinity.
+        Candidates are ordered as in the cell-wise recursion (diagonal,
+        vertical, horizontal; extension before opening) so that ties are
+        broken the same way. Traceback codes for columns max(1, row.offset)
+        and up are written to backtrack if given.
+        """
+        lo, scores = row
+        hi = lo + scores.shape[1]
+        first = max(lo, 1)
+        if first >= hi:
+            return
+        n_prev, width = len(prev_is), prev_b.shape[1]
+        cols = np.arange(first, hi)
+        prev_js = prev_b[first-1:hi-1]
+
+        # Vertical and diagonal moves only depend on the predecessor rows
+        diag = np.hstack([gather(prev_row, 0, prev_js) for prev_row in prev_rows]
+                         ) + row_scores[first-1:hi-1, None]
+        up = np.stack([gather(prev_row, 0, cols) for prev_row in prev_rows],
+                      axis=1) + gap_open
+        a_candidates = np.hstack((np.stack([gather(prev_row, 1, cols) for prev_row in prev_rows],
+                                           axis=1) + gap_extend, up))
+        a_scores = a_candidates.max(axis=1)
+        vertical = np.maximum(np.maximum(diag.max(axis=1), up.max(axis=1)),
+                              a_scores)
+
+        # Horizontal gaps: prefix-max scan along each linear run of seq_b
+        row_m, row_a, row_b = scores
+        extend = max(gap_extend, gap_open)
+        starts = np.union1d([first], first+np.flatnonzero(~linear_b[first-1:hi-1]))
+        for start, end in zip(starts, chain(starts[1:], [hi])):
+            prevs = prev_b[start-1][prev_b[start-1] >= 0]
+            s, v, length = (start-lo, start-first, end-start)
+            row_b[s] = max(gather(row, 2, prevs).max()+gap_extend,
+                           gather(row, 0, prevs).max()+gap_open)
+            row_m[s] = max(vertical[v], row_b[s])
+            if length == 1:
+                continue
+            steps = np.arange(1, length)
+            best_open = np.maximum.accumulate(
+                vertical[v:v+length-1]+gap_open-extend*steps)
+            row_b[s+1:s+length] = np.maximum(
+                extend*steps + np.maximum(row_b[s], best_open), neg_inf)
+            row_m[s+1:s+length] = np.maximum(vertical[v+1:v+length],
+                                             row_b[s+1:s+length])
+        row_a[first-lo:] = a_scores
+        # Saturate at the sentinel so unreachable cells cannot underflow
+        np.maximum(scores, neg_inf, out=scores)
+        if backtrack is None:
+            return
+
+        # Tracebacks, now that the horizontal predecessors are known
+        a_idx = np.argmax(a_candidates, axis=1)
+        left = gather(row, 0, prev_js)+gap_open
+        b_candidates = np.hstack((gather(row, 2, prev_js)+gap_extend, left))
+        b_idx = np.argmax(b_candidates, axis=1)
+        b_scores = b_candidates.max(axis=1)
+        lin_candidates = np.hstack((diag, up, left))
+        lin_idx = np.argmax(lin_candidates, axis=1)
+        lin_scores = lin_candidates.max(axis=1)
+        n_diag = n_prev*width
+        lin_moves = np.where(lin_idx < n_diag, DIAG,
+                             np.where(lin_idx < n_diag+n_prev, UP, LEFT))
+        lin_slots = lin_idx - np.where(lin_moves == DIAG, 0,
+                                       np.where(lin_moves == UP, n_diag, n_diag+n_prev))
+        use_lin = (lin_scores >= a_scores) & (lin_scores >= b_scores)
+        backtrack[0] = np.where(use_lin, _encode(lin_moves, lin_slots),
+                                np.where(a_scores >= b_scores, FROM_A, FROM_B))
+        backtrack[1] = _encode(np.where(a_idx < n_prev, EXTEND, OPEN), a_idx % n_prev)
+        backtrack[2] = _encode(np.where(b_idx < width, EXTEND, OPEN), b_idx % width)
+
     def align(seq_a, seq_b):
-        comb_scores = get_comb_scores(seq_a, seq_b)
+        profile = get_profile(seq_b)
         matrix, open_matrix_a, open_matrix_b = init_matrices(
             len(seq_a), len(seq_b))
         for i in range(1, len(seq_a)+1):
             for j in range(1, len(seq_b)+1):
                 scores = [matrix[i-1, j]+gap_open,
                           matrix[i, j-1]+gap_open,
-                          matrix[i-1, j-1]+comb_scores[i-1, j-1]]
+                          matrix[i-1, j-1]+profile[seq_a[i-1], j-1]]
                 open_matrix_a[i, j] = max(matrix[i-1, j]+gap_open,
                                           open_matrix_a[i-1, j]+gap_extend)
                 open_matrix_b[i, j] = max(matrix[i, j-1]+gap_open,
                                           open_matrix_b[i, j-1] + gap_extend)
                 matrix[i, j] = max(max(scores), open_matrix_a[i, j], open_matrix_b[i, j])
 
-    def graph_align(graph_a, graph_b):
+    def graph_align(prepared_a, graph_b):
+        graph_a, (indptr_a, indices_a, linear_a), last_use = prepared_a
         seq_a = graph_a.sequences
         seq_b = graph_b.sequences
-        comb_scores = get_comb_scores(seq_a, seq_b)
-        matrix, open_matrix_a, open_matrix_b = init_matrices(
-            len(seq_a), len(seq_b))
-        get_prev_a = get_prev_func(graph_a)
-        get_prev_b = get_prev_func(graph_b)
-        backtrack_matrices = np.zeros((3, len(seq_a)+1, len(seq_b)+1, 3),
-                                      dtype="int")
-        backtrack_matrices[:, 0, 1:, 1] = np.arange(len(seq_b))
-        backtrack_matrices[:, 0, 1:, 2] = 1
-        backtrack_matrices[:, 1:, 0, 0] = np.arange(len(seq_a))
-        backtrack_matrices[:, 1:, 0, 2] = 2
-
-        def get_best_linear(i, j):
-            indels = list(chain(((prev_i, j) for prev_i in prev_is),
-                                ((i, prev_j) for prev_j in prev_js)))
-            indel_scores = [matrix[_i, _j]+gap_open for _i, _j in indels]
-            matches = [(prev_i, prev_j)
-                       for prev_i in prev_is
-                       for prev_j in prev_js]
-            match_scores = [matrix[_i, _j]+comb_scores[_i, _j]
-                            for _i, _j in matches]
-            tmp = list(chain(zip(match_scores, matches),
-                             zip(indel_scores, indels)))
-            i = np.argmax(match_scores+indel_scores)
-            return tmp[i]
-
-        # return max(tmp)
-
-        def get_best_a(prev_is, j):
-            new_open = ((matrix[prev_i, j] + gap_open, (prev_i, j, 0))
-                        for prev_i in prev_is)
-            old_open = ((open_matrix_a[prev_i, j] + gap_extend, (prev_i, j, 1))
-                        for prev_i in prev_is)
-            tmp = list(chain(old_open, new_open))
-            i = np.argmax([t[0] for t in tmp])
-            return tmp[i]
-
-        def get_best_b(i, prev_js):
-            new_open = ((matrix[i, prev_j] + gap_open,
-                         (i, prev_j, 0)) for prev_j in prev_js)
-            old_open = ((open_matrix_b[i, prev_j] + gap_extend,
-                         (i, prev_j, 2)) for prev_j in prev_js)
-            tmp = list(chain(old_open, new_open))
-            i = np.argmax([t[0] for t in tmp])
-            return tmp[i]
-
-        def backtrack(backtrack_matrix):
-            i, j, k = (len(seq_a), len(seq_b), 0)
-            path = [(i, j)]
-            while i > 0 or j > 0:
-                i, j, k = backtrack_matrix[k, i, j]
+        len_a, len_b = len(seq_a), len(seq_b)
+        check_range(len_a, len_b)
+        profile = get_profile(seq_b)
+        prev_index_b = get_prev_index(graph_b)
+        prev_b = get_prevs(prev_index_b, np.arange(1, len_b+1))
+        depths_a = get_shortest_depths(prepared_a.prev_index)
+        depths_b = get_shortest_depths(prev_index_b)
+        linear_b = prev_index_b.is_linear[1:]
+        width_a, width_b = np.diff(indptr_a).max(initial=1), prev_b.shape[1]
+        extend = max(gap_extend, gap_open)
+        gap_reach = len_b if extend >= 0 or x_drop is None else int(x_drop // -extend)
+        code_type = np.min_scalar_type(_encode(1 << MOVE_BITS, width_a*width_b))
+        max_score = np.max(score_matrix)
+        linear = bool(np.all(linear_a[1:]) and np.all(linear_b))
+        max_next_b = np.full(len_b+1, -1)
+        prev_valid = prev_b >= 0
+        np.maximum.at(max_next_b, prev_b[prev_valid],
+                      np.broadcast_to(np.arange(1, len_b+1)[:, None], prev_b.shape)[prev_valid])
+
+        def get_window(i, live):
+            """Columns lo..hi-1 of the band and x-drop window around row i
+
+            A fixed band follows the line from (0, 0) to (len_a, len_b) and
+            covers it from the first predecessor row to row i, so that the
+            band is connected. An adaptive band is centered diagonally
+            below the best cell of the predecessor rows. The last row is
+            stretched to reach the end of seq_b, and the third value says
+            whether it had to be.
+
+            The x-drop window reaches from the first kept cell of the
+            predecessor rows to as far right as a horizontal gap from
+            their last kept cell can go without being pruned.
+            """
+            lo, hi, stretched = (0, len_b+1, False)
+            prev_is = indices_a[indptr_a[i]:indptr_a[i+1]]
+            if x_drop is not None:
+                prev_rows = [live[p] for p in prev_is]
+                lo = min((row.offset for row in prev_rows), default=0)
+                hi = max((row.offset+row.values.shape[1] for row in prev_rows), default=0)
+                hi = min(len_b+1, hi+1+gap_reach)
+            if band is None:
+                return lo, hi, stretched
+            if adaptive_band and i > 0:
+                best = max((live[p] for p in prev_is), key=lambda row: row.values[0].max())
+                center = min(best.offset+np.argmax(best.values[0])+1, len_b)
+                band_lo, band_hi = (center-band, center+band+1)
+            else:
+                band_lo = min(prev_is, default=i)*len_b // max(len_a, 1) - band
+                band_hi = -(-i*len_b // max(len_a, 1)) + band + 1
+            if i == len_a and band_hi <= len_b:
+                band_lo, band_hi, stretched = (min(band_lo, len_b), len_b+1, True)
+            return max(lo, band_lo), min(hi, band_hi), stretched
+
+        def drop_cells(row):
+            """Prune the cells of row scoring more than x_drop below the best so far"""
+            nonlocal best_seen
+            if row.values.shape[1]:
+                best_seen = max(best_seen, row.values[0].max())
+            kept = np.flatnonzero(row.values[0] >= best_seen-x_drop)
+            if not kept.size:
+                return Row(row.offset, row.values[:, :0])
+            values = row.values[:, kept[0]:kept[-1]+1].copy()
+            values[:, values[0] < best_seen-x_drop] = neg_inf
+            return Row(row.offset+kept[0], values)
+
+        def exit_bound(i, row, lo, hi):
+            """Best score a path leaving window lo..hi-1 from row i could reach
+
+            A cell exits the window if it lies outside lo..hi-1 or has a
+            successor column at or beyond hi. Its score is bounded by the
+            cell value plus a match for every base left on the shorter
+            side and a gap for every base of difference in length, which
+            is only known for linear graphs.
+            """
+            cols = row.offset + np.arange(row.values.shape[1])
+            exits = (cols < lo) | (cols >= hi) | (max_next_b[cols] >= hi)
+            if not exits.any():
+                return -np.inf
+            rest_a, rest_b = (len_a-i, len_b-cols[exits])
+            bound = max(max_score, 0)*np.minimum(rest_a, rest_b)
+            if extend > 0:
+                bound = bound + extend*(rest_a+rest_b)
+            elif linear:
+                bound = bound + extend*np.abs(rest_a-rest_b)
+            return (row.values[0, exits].astype(float) + bound).max()
+
+        def fill_rows(start, end, live, backtrack=None):
+            """Compute rows start..end-1, keeping only rows still needed in live
+
+            Returns whether the last row had to be stretched to the end of
+            seq_b, and raises exit_best to the best score a path leaving the
+            band from any of the rows could reach.
+            """
+            nonlocal exit_best
+            cut_off = False
+            for i in range(start, end):
+                prev_is = indices_a[indptr_a[i]:indptr_a[i+1]]
+                lo, hi, stretched = get_window(i, live)
+                hi = max(lo, hi)
+                windows[i] = (lo, hi)
+                row = init_row(i, lo, hi, depths_a, depths_b)
+                codes = None
+                if backtrack is not None:
+                    codes = np.zeros((3, hi-max(lo, 1)), dtype=code_type)
+                    backtrack.append(Row(max(lo, 1), codes))
+                fill_row(i, prev_is, [live[p] for p in prev_is], row,
+                         profile[seq_a[i-1]], prev_b, linear_b, codes)
+                cut_off |= stretched
+                if band is not None:
+                    exit_best = max([exit_best, exit_bound(i, row, lo, hi)] +
+                                    [exit_bound(p, live[p], lo, hi) for p in prev_is])
+                if x_drop is not None:
+                    row = drop_cells(row)
+                    if not row.values.shape[1]:
+                        return cut_off
+                live[i] = row
+                for p in chain(prev_is, [i]):
+                    if last_use[p] <= i < len_a:
+                        live.pop(p, None)
+            return cut_off
+
+        def on_edge(path):
+            """Whether any cell of the path is on the edge of the band"""
+            return any(j == windows[i][0] > 0 or j == windows[i][1]-1 < len_b
+                       for i, j in path)
+
+        def get_prev_cell(k, i, j, code):
+            """Recover the (i, j, k) that cell (i, j) in matrix k came from"""
+            move, slot = _decode(code)
+            prev_is = indices_a[indptr_a[i]:indptr_a[i+1]]
+            prev_js = prev_b[j-1]
+            if k == 0 and move == DIAG:
+                return (prev_is[slot // width_b], prev_js[slot % width_b], 0)
+            if k == 0:
+                return (prev_is[slot], j, 0) if move == UP else (i, prev_js[slot], 0)
+            if k == 1:
+                return (prev_is[slot], j, k if move == EXTEND else 0)
+            return (i, prev_js[slot], k if move == EXTEND else 0)
+
+        def backtrack(i, j, k, path, first_row=0, get_code=None):
+            while (i > 0 or j > 0) and i >= first_row:
+                if j == 0:
+                    prev_is = indices_a[indptr_a[i]:indptr_a[i+1]]
+                    i, j, k = (prev_is[np.argmin(depths_a[prev_is])], 0, 2)
+                elif i == 0:
+                    prev_js = prev_b[j-1][prev_b[j-1] >= 0]
+                    i, j, k = (0, prev_js[np.argmin(depths_b[prev_js])], 1)
+                else:
+                    code = get_code(k, i, j)
+                    if k == 0 and code in (FROM_A, FROM_B):
+                        k = 1 if code == FROM_A else 2
+                        code = get_code(k, i, j)
+                    i, j, k = get_prev_cell(k, i, j, code)
                 path.append((i, j))
-            return path[::-1]
+            return i, j, k
 
         def translate_path(path, seq):
             alignment = []
@@ -119,45 +426,73 @@ def get_align_func(gap_open, score_matrix, gap_extend=None,
                 if idx == next_idx:
                     alignment.append("-")
                 else:
-                    alignment.append(seq[idx])
+                    alignment.append(seq[next_idx-1])
             return "".join(alignment)
 
-        for i in range(1, len(seq_a)+1):
-            for j in range(1, len(seq_b)+1):
-                prev_is = get_prev_a(i)
-                prev_js = get_prev_b(j)
-                score, ij = get_best_linear(i, j)
-                ijk = (ij[0], ij[1], 0)
-                a_score, a_ijk = get_best_a(prev_is, j)
-                b_score, b_ijk = get_best_b(i, prev_js)
-                open_matrix_a[i, j] = a_score
-                backtrack_matrices[1, i, j] = a_ijk
-                open_matrix_b[i, j] = b_score
-                backtrack_matrices[2, i, j] = b_ijk
-                scores = [score, a_score, b_score]
-                idxs = [ijk, a_ijk, b_ijk]
-                max_idx = np.argmax(scores)
-                m_score = scores[max_idx]
-                m_ijk = idxs[max_idx]
-                # m_score, m_ijk = max(((score, ijk),
-                #                      (a_score, a_ijk), (b_score, b_ijk)))
-                backtrack_matrices[0, i, j] = m_ijk
-                matrix[i, j] = m_score
-        # print(matrix)
-        if return_seq:
-            path = backtrack(backtrack_matrices)
-            path_a, path_b = zip(*path)
-            seq_a = [DNAAlphabet.to_str[c] for c in seq_a]
-            seq_b = [DNAAlphabet.to_str[c] for c in seq_b]
-            alignment_a = translate_path(path_a, seq_a)
-            alignment_b = translate_path(path_b, seq_b)
-            print(matrix)
-            # print(open_matrix_a[:10, :10])
-            print(open_matrix_b)
-            return (alignment_a, alignment_b, matrix[-1, -1])
-        return matrix[-1, -1]
+        lo, hi, cut_off = get_window(0, {})
+        hi = max(lo, hi)
+        windows = {0: (lo, hi)}
+        live = {0: init_row(0, lo, hi, depths_a, depths_b)}
+        exit_best = -np.inf if band is None else exit_bound(0, live[0], lo, hi)
+        if not (return_seq or return_path):
+            best_seen = 0
+            if x_drop is not None:
+                live[0] = drop_cells(live[0])
+            cut_off |= fill_rows(1, len_a+1, live)
+            last_row = live.get(len_a)
+            aborted = bool(last_row is None or
+                           last_row.offset+last_row.values.shape[1] <= len_b or
+                           last_row.values[0, -1] == neg_inf)
+            score = neg_inf if aborted else last_row.values[0, -1]
+            cut_off |= bool(exit_best >= score)
+            flags = ([cut_off] if band is not None else []) + \
+                ([aborted] if x_drop is not None else [])
+            return (score, *flags) if flags else score
+
+        # Keep the live rows at the start of each block, and recompute
+        # the blocks with tracebacks from the last one backwards
+        block_size = max(1, int(np.ceil(np.sqrt(len_a)))) if low_memory else max(1, len_a)
+        starts = list(range(1, len_a+1, block_size))
+        checkpoints = []
+        for start in starts[:-1]:
+            checkpoints.append(dict(live))
+            cut_off |= fill_rows(start, start+block_size, live)
+        checkpoints.append(live)
+        score = None
+        i, j, k = (len_a, len_b, 0)
+        path = [(i, j)]
+        for start in reversed(starts):
+            live = checkpoints.pop()
+            if i < start:
+                continue
+            end = min(start+block_size, len_a+1)
+            backtrack_rows = []
+            cut_off |= fill_rows(start, end, live, backtrack_rows)
+            if score is None:
+                score = live[len_a].values[0, -1]
+
+            def get_code(k, i, j):
+                offset, codes = backtrack_rows[i-start]
+                return codes[k, j-offset]
+
+            i, j, k = backtrack(i, j, k, path, start, get_code)
+        if score is None:
+            score = live[0].values[0, -1]
+        backtrack(i, j, k, path)
+        path = [(int(i), int(j)) for i, j in path[::-1]]
+        cut_off |= bool(exit_best >= score) or (band is not None and on_edge(path))
+        if return_path:
+            return (path, score) if band is None else (path, score, cut_off)
+        path_a, path_b = zip(*path)
+        seq_a = [DNAAlphabet.to_str[c] for c in seq_a]
+        seq_b = [DNAAlphabet.to_str[c] for c in seq_b]
+        alignment_a = translate_path(path_a, seq_a)
+        alignment_b = translate_path(path_b, seq_b)
+        if band is None:
+            return (alignment_a, alignment_b, score)
+        return (alignment_a, alignment_b, score, cut_off)
 
     if use_graphs:
-        return lambda seq_a, seq_b: graph_align(naive_graph(seq_a),
+        return lambda seq_a, seq_b: graph_align(prepare_graph(seq_a),
                                                 naive_graph(seq_b))
     return align
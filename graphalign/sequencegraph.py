@@ -1,4 +1,5 @@
 from collections import namedtuple, defaultdict
+from collections.abc import Mapping
 import numpy as np
 
 
@@ -9,79 +10,264 @@ MathGraph = namedtuple("MathGraph", ["nodes", "edges"])
 
 Alignment = namedtuple("Alignment", ["seq_a", "seq_b"])
 
+PrevIndex = namedtuple("PrevIndex", ["indptr", "indices", "is_linear"])
+
+NextIndex = namedtuple("NextIndex", ["indptr", "indices", "is_linear"])
+
+NodeMap = namedtuple("NodeMap", ["nodes", "offsets"])
+
+PositionIndex = namedtuple("PositionIndex", ["node_offsets", "n_bases"])
+
+Subgraph = namedtuple("Subgraph", ["graph", "start", "first_node"])
+
+MATCH, MISMATCH, GAP_A, GAP_B = range(4)
+
+_ENCODE = np.full(256, 255, dtype="uint8")
+for _code, _chars in enumerate(("Aa", "Cc", "Gg", "Tt")):
+    _ENCODE[[ord(c) for c in _chars]] = _code
+
+
+class CSRAdjacency(Mapping):
+    """Read-only adjacency list view of CSR arrays
+
+    Like the dicts used as adj_list, nodes without edges are left out.
+    """
+
+    __slots__ = ("indptr", "indices")
+
+    def __init__(self, indptr, indices):
+        self.indptr = indptr
+        self.indices = indices
+
+    def __getitem__(self, node):
+        if not 0 <= node < len(self.indptr)-1 or self.indptr[node] == self.indptr[node+1]:
+            raise KeyError(node)
+        return self.indices[self.indptr[node]:self.indptr[node+1]].tolist()
+
+    def __iter__(self):
+        return iter(np.flatnonzero(np.diff(self.indptr)).tolist())
+
+    def __len__(self):
+        return int(np.count_nonzero(np.diff(self.indptr)))
+
+
+def _to_csr(adj_list, n_nodes):
+    counts = [len(adj_list.get(node, ())) for node in range(n_nodes)]
+    indptr = np.concatenate(([0], np.cumsum(counts, dtype="int64")))
+    indices = np.fromiter((to_node for node in range(n_nodes)
+                           for to_node in adj_list.get(node, ())),
+                          dtype="int64", count=indptr[-1])
+    return indptr, indices
+
+
+class CompactSequenceGraph:
+    """SequenceGraph stored in arrays
+
+    sequences is a uint8 array and node_offsets an int64 array, and the
+    edges are kept as CSR arrays in both directions. adj_list gives a
+    mapping view of the forward edges, so the graph can be used wherever
+    a SequenceGraph is expected.
+    """
+
+    __slots__ = ("sequences", "node_offsets", "adj_indptr", "adj_indices",
+                 "rev_indptr", "rev_indices")
+
+    def __init__(self, sequences, node_offsets, adj_indptr, adj_indices,
+                 rev_indptr=None, rev_indices=None):
+        self.sequences = np.asarray(sequences, dtype="uint8")
+        self.node_offsets = np.asarray(node_offsets, dtype="int64")
+        self.adj_indptr = np.asarray(adj_indptr, dtype="int64")
+        self.adj_indices = np.asarray(adj_indices, dtype="int64")
+        if rev_indptr is None:
+            n_nodes = len(self.node_offsets)
+            sources = np.repeat(np.arange(n_nodes), np.diff(self.adj_indptr))
+            order = np.argsort(self.adj_indices, kind="stable")
+            rev_indptr = np.concatenate(
+                ([0], np.cumsum(np.bincount(self.adj_indices, minlength=n_nodes))))
+            rev_indices = sources[order]
+        self.rev_indptr = np.asarray(rev_indptr, dtype="int64")
+        self.rev_indices = np.asarray(rev_indices, dtype="int64")
+
+    @classmethod
+    def from_graph(cls, graph):
+        """Compact copy of a SequenceGraph, keeping the order of the edges"""
+        node_offsets = np.fromiter(graph.node_offsets, dtype="int64")
+        n_nodes = len(node_offsets)
+        adj_indptr, adj_indices = _to_csr(graph.adj_list, n_nodes)
+        rev_indptr, rev_indices = _to_csr(_get_reverse_adj_list(graph.adj_list), n_nodes)
+        return cls(graph.sequences, node_offsets, adj_indptr, adj_indices,
+                   rev_indptr, rev_indices)
+
+    @property
+    def adj_list(self):
+        return CSRAdjacency(self.adj_indptr, self.adj_indices)
+
+    @property
+    def reverse_adj_list(self):
+        return CSRAdjacency(self.rev_indptr, self.rev_indices)
+
+    def _replace(self, **fields):
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(fields)
+        return self.__class__(**values)
+
+    def __iter__(self):
+        return iter((self.sequences, self.node_offsets, self.adj_list))
+
+    def __repr__(self):
+        return "%s(%s bases, %s nodes, %s edges)" % (
+            self.__class__.__name__, len(self.sequences),
+            len(self.node_offsets), len(self.adj_indices))
+
 
 def alignment_to_sequencegraph(alignment):
-    seq_a, seq_b = alignment
-    print(seq_a, seq_b)
-    adj_list = defaultdict(set)
-    node_offsets = []
-    sequences = []
-    iter_a, iter_b = (iter(seq_a), iter(seq_b))
-    cur_a, cur_b = (next(iter_a), next(iter_b))
-    print(list(zip(seq_a, seq_b)))
-    pairs = iter(zip(seq_a, seq_b))
-    cur_a, cur_b = next(pairs)
-    i = 0
-    prev_a, prev_b = (None, None)
-    while True:
-        cur_node = len(node_offsets)
-        node_offsets.append(i)
-        try:
-            if cur_a == cur_b:
-                adj_list[prev_a].add(cur_node)
-                adj_list[prev_b].add(cur_node)
-                prev_a = cur_node
-                prev_b = cur_node
-                while cur_a == cur_b:
-                    print("MATCH",  cur_a, cur_b)
-                    sequences.append(cur_a)
-                    i += 1
-                    cur_a, cur_b = next(pairs)
-                continue
-            elif cur_a == "-":
-                adj_list[prev_a].add(cur_node)
-                adj_list[prev_b].add(cur_node)
-                prev_b = cur_node
-                while cur_a == "-":
-                    sequences.append(cur_b)
-                    i += 1
-                    cur_a, cur_b = next(pairs)
-                continue
-            elif cur_b == "-":
-                adj_list[prev_a].add(cur_node)
-                adj_list[prev_b].add(cur_node)
-                prev_a = cur_node
-                while cur_b == "-":
-                    sequences.append(cur_a)
-                    i += 1
-                    cur_a, cur_b = next(pairs)
-                continue
-            else:
-                adj_list[prev_a].add(cur_node)
-                adj_list[prev_b].add(cur_node)
-                adj_list[prev_a].add(cur_node+1)
-                adj_list[prev_b].add(cur_node+1)
-                prev_a = cur_node
-                prev_b = cur_node+1
-                sequences.append(cur_a)
-                i += 1
-                node_offsets.append(i)
-                sequences.append(cur_b)
-                i += 1
-                cur_a, cur_b = next(pairs)
-        except StopIteration:
-            break
-    del adj_list[None]
-    return SequenceGraph(sequences, node_offsets, adj_list)
+    """Graph of a pairwise alignment, such as the output of graph_align with return_seq
+
+    Each run of matching columns becomes a node shared by both sequences,
+    and runs of mismatches or gaps become a node for each sequence that
+    has bases in them, so the graph holds exactly the two aligned
+    sequences as paths. Returns a CompactSequenceGraph with the nodes in
+    topological order.
+    """
+    columns = [np.frombuffer(seq.encode() if isinstance(seq, str) else bytes(seq), dtype="uint8")
+               for seq in alignment[:2]]
+    if len(columns[0]) != len(columns[1]):
+        raise ValueError("Aligned sequences differ in length: %s and %s" % tuple(map(len, columns)))
+    is_gap = [column == ord("-") for column in columns]
+    kinds = np.where(columns[0] == columns[1], MATCH,
+                     np.where(is_gap[0], GAP_A, np.where(is_gap[1], GAP_B, MISMATCH)))
+    run_starts = np.flatnonzero(np.diff(kinds, prepend=-1))
+    run_lengths = np.diff(np.append(run_starts, len(kinds)))
+    run_kinds = kinds[run_starts]
+    # One node per run, and a second one for the b side of mismatch runs
+    n_run_nodes = np.where(run_kinds == MISMATCH, 2, 1)
+    node_runs = np.repeat(np.arange(len(run_starts)), n_run_nodes)
+    node_kinds = run_kinds[node_runs]
+    is_second = np.zeros(len(node_runs), dtype="bool")
+    is_second[np.cumsum(n_run_nodes)[run_kinds == MISMATCH]-1] = True
+    in_a = (node_kinds == MATCH) | (node_kinds == GAP_B) | ((node_kinds == MISMATCH) & ~is_second)
+    in_b = (node_kinds == MATCH) | (node_kinds == GAP_A) | is_second
+    lengths = run_lengths[node_runs]
+    starts = run_starts[node_runs] + np.where(in_a, 0, len(kinds))
+    sequences = _ENCODE[np.concatenate(columns)[_get_ranges(starts, lengths)]]
+    if np.any(sequences == 255):
+        raise ValueError("Unsupported character in alignment")
+    edges = [np.flatnonzero(in_path) for in_path in (in_a, in_b)]
+    n_nodes = len(node_runs)
+    keys = np.unique(np.concatenate([path[:-1]*n_nodes+path[1:] for path in edges]))
+    adj_indptr = np.concatenate(([0], np.cumsum(np.bincount(keys // n_nodes, minlength=n_nodes))))
+    return CompactSequenceGraph(sequences, np.cumsum(lengths)-lengths, adj_indptr, keys % n_nodes)
 
 
 def naive_graph(sequence):
-    if isinstance(sequence, SequenceGraph):
+    """A linear sequence as a graph of a single node, as compact_graph would give"""
+    if isinstance(sequence, (SequenceGraph, CompactSequenceGraph)):
         return sequence
-    n_nodes = len(sequence)//3
-    node_offsets = list(i*3 for i in range(n_nodes))
-    adj_list = {i: [i+1] for i in range(n_nodes-1)}
-    return SequenceGraph(sequence, node_offsets, adj_list)
+    return SequenceGraph(sequence, [0] if len(sequence) else [], {})
+
+
+def _get_ranges(starts, lengths):
+    """Concatenation of the ranges start..start+length-1"""
+    ends = np.cumsum(lengths)
+    return np.arange(ends[-1] if len(ends) else 0)+np.repeat(starts-ends+lengths, lengths)
+
+
+def compact_graph(graph):
+    """Merge the maximal non-branching paths of a graph into single nodes
+
+    A node is merged into its predecessor when it is the only successor of
+    its only predecessor. Each merged node takes the place of the first
+    node of its path, which keeps the nodes in topological order. Returns
+    the compacted graph, of the same type as graph, and a NodeMap giving
+    the new node of each old node and the offset of the old node in it.
+    """
+    compact = graph if isinstance(graph, CompactSequenceGraph) else \
+        CompactSequenceGraph.from_graph(graph)
+    n_nodes = len(compact.node_offsets)
+    lengths = np.diff(np.append(compact.node_offsets, len(compact.sequences)))
+    out_degrees = np.diff(compact.adj_indptr)
+    next_nodes = np.full(n_nodes, -1)
+    next_nodes[out_degrees == 1] = compact.adj_indices[compact.adj_indptr[:-1][out_degrees == 1]]
+    joins_previous = np.zeros(n_nodes, dtype="bool")
+    candidates = next_nodes[next_nodes >= 0]
+    joins_previous[candidates[np.diff(compact.rev_indptr)[candidates] == 1]] = True
+    order = []
+    heads = np.flatnonzero(~joins_previous)
+    for head in heads.tolist():
+        order.append(head)
+        node = next_nodes[head]
+        while node >= 0 and joins_previous[node]:
+            order.append(node)
+            node = next_nodes[node]
+    order = np.array(order, dtype="int")
+    path_ids = np.cumsum(~joins_previous[order])-1
+    starts = np.cumsum(lengths[order])-lengths[order]
+    node_offsets = starts[~joins_previous[order]]
+    node_map = NodeMap(np.empty(n_nodes, dtype="int"), np.empty(n_nodes, dtype="int"))
+    node_map.nodes[order] = path_ids
+    node_map.offsets[order] = starts-node_offsets[path_ids]
+    sequences = compact.sequences[_get_ranges(compact.node_offsets[order], lengths[order])]
+    tails = order[np.append(np.flatnonzero(np.diff(path_ids)), len(order)-1)] if n_nodes else order
+    counts = out_degrees[tails]
+    adj_indptr = np.concatenate(([0], np.cumsum(counts)))
+    adj_indices = node_map.nodes[compact.adj_indices[_get_ranges(compact.adj_indptr[tails], counts)]]
+    new_graph = CompactSequenceGraph(sequences, node_offsets, adj_indptr, adj_indices)
+    if isinstance(graph, CompactSequenceGraph):
+        return new_graph, node_map
+    if not isinstance(graph.sequences, np.ndarray):
+        sequences = sequences.tolist()
+    return SequenceGraph(sequences, node_offsets.tolist(), dict(new_graph.adj_list)), node_map
+
+
+def get_position_index(graph):
+    """Node offsets of a graph as an array, for binary search over positions"""
+    return PositionIndex(np.fromiter(graph.node_offsets, dtype="int64"), len(graph.sequences))
+
+
+def get_node_positions(index, positions):
+    """The node and the offset in it of each linear sequence position"""
+    positions = np.asarray(positions)
+    nodes = np.searchsorted(index.node_offsets, positions, side="right")-1
+    return nodes, positions-index.node_offsets[nodes]
+
+
+def get_linear_positions(index, nodes, offsets):
+    """The linear sequence position of each (node, offset)"""
+    return index.node_offsets[np.asarray(nodes)]+offsets
+
+
+def extract_subgraph(graph, start, end, context=0, index=None):
+    """The part of a graph covering sequence positions start-context..end+context-1
+
+    The nodes overlapping the window are renumbered from 0, with the first
+    and last clipped to it, and only edges between them are kept. The
+    sequences are a slice of the graph's, so with the index from
+    get_position_index and an array graph this takes O(log n + window)
+    time. Returns a Subgraph of the same type as graph, whose position p
+    and node v are position p+start and node v+first_node in graph.
+    """
+    if index is None:
+        index = get_position_index(graph)
+    start, end = (max(0, start-context), min(index.n_bases, end+context))
+    end = max(start, end)
+    first = int(np.searchsorted(index.node_offsets, start, side="right"))-1 \
+        if start < index.n_bases else len(index.node_offsets)
+    last = int(np.searchsorted(index.node_offsets, end, side="left"))
+    first = min(max(first, 0), last)
+    node_offsets = np.maximum(index.node_offsets[first:last], start)-start
+    sequences = graph.sequences[start:end]
+    if isinstance(graph, CompactSequenceGraph):
+        adj_indptr = graph.adj_indptr[first:last+1]
+        adj_indices = graph.adj_indices[adj_indptr[0]:adj_indptr[-1]]
+        keep = adj_indices < last
+        sources = np.repeat(np.arange(last-first), np.diff(adj_indptr))
+        adj_indptr = np.concatenate(([0], np.cumsum(np.bincount(sources[keep], minlength=last-first))))
+        return Subgraph(CompactSequenceGraph(sequences, node_offsets, adj_indptr, adj_indices[keep]-first),
+                        start, first)
+    adj_list = {node-first: [next_node-first for next_node in graph.adj_list.get(node, ())
+                             if next_node < last]
+                for node in range(first, last)}
+    return Subgraph(SequenceGraph(sequences, node_offsets.tolist(), adj_list), start, first)
 
 
 def _get_reverse_adj_list(adj_list):
@@ -92,18 +278,97 @@ def _get_reverse_adj_list(adj_list):
     return reverse_adj_list
 
 
+def _get_reverse_csr(graph, n_nodes):
+    if isinstance(graph, CompactSequenceGraph):
+        return graph.rev_indptr, graph.rev_indices
+    return _to_csr(_get_reverse_adj_list(graph.adj_list), n_nodes)
+
+
+def get_prev_index(graph):
+    """Predecessor rows of each alignment row, in CSR form
+
+    Row r holds sequence position r-1, row 0 is the empty prefix. The
+    predecessors of row r are indices[indptr[r]:indptr[r+1]], and
+    is_linear[r] is set when that is just [r-1].
+    """
+    n = len(graph.sequences)
+    node_offsets = np.fromiter(graph.node_offsets, dtype="int")
+    node_ends = np.append(node_offsets[1:], n)
+    rev_indptr, rev_indices = _get_reverse_csr(graph, len(node_offsets))
+    degrees = np.diff(rev_indptr)
+    counts = np.ones(n+1, dtype="int")
+    counts[0] = 0
+    counts[node_offsets+1] = np.maximum(degrees, 1)
+    indptr = np.concatenate(([0], np.cumsum(counts)))
+    indices = np.repeat(np.arange(-1, n), counts)
+    # Source nodes follow row 0, other nodes the ends of their predecessors
+    firsts = indptr[node_offsets+1]
+    indices[firsts[degrees == 0]] = 0
+    has_prevs = degrees > 0
+    ranks = np.arange(len(rev_indices))-np.repeat(rev_indptr[:-1][has_prevs], degrees[has_prevs])
+    indices[np.repeat(firsts[has_prevs], degrees[has_prevs])+ranks] = node_ends[rev_indices]
+    is_linear = np.zeros(n+1, dtype="bool")
+    is_linear[1:] = (counts[1:] == 1) & (indices[indptr[1:-1]] == np.arange(n))
+    return PrevIndex(indptr, indices, is_linear)
+
+
+def get_next_index(prev_index):
+    """Successor rows of each alignment row, the transpose of a PrevIndex
+
+    is_linear[r] is set when the successors of row r are just [r+1].
+    """
+    indptr, indices, _ = prev_index
+    n_rows = len(indptr)-1
+    sources = np.repeat(np.arange(n_rows), np.diff(indptr))
+    order = np.argsort(indices, kind="stable")
+    next_indptr = np.concatenate(([0], np.cumsum(np.bincount(indices, minlength=n_rows))))
+    next_indices = sources[order]
+    is_linear = np.zeros(n_rows, dtype="bool")
+    single = np.diff(next_indptr) == 1
+    is_linear[single] = next_indices[next_indptr[:-1][single]] == np.flatnonzero(single)+1
+    return NextIndex(next_indptr, next_indices, is_linear)
+
+
+def get_longest_depths(prev_index):
+    """Length of the longest path from row 0 to each row"""
+    indptr, indices, is_linear = prev_index
+    n_rows = len(indptr)-1
+    depths = np.arange(n_rows)
+    starts = np.flatnonzero(~is_linear)
+    for start, end in zip(starts, np.append(starts[1:], n_rows)):
+        base = depths[indices[indptr[start]:indptr[start+1]]].max()+1 if start else 0
+        depths[start:end] = base+np.arange(end-start)
+    return depths
+
+
+def get_shortest_depths(prev_index):
+    """Length of the shortest path from row 0 to each row"""
+    indptr, indices, is_linear = prev_index
+    n_rows = len(indptr)-1
+    depths = np.arange(n_rows)
+    starts = np.flatnonzero(~is_linear)
+    for start, end in zip(starts, np.append(starts[1:], n_rows)):
+        base = depths[indices[indptr[start]:indptr[start+1]]].min()+1 if start else 0
+        depths[start:end] = base+np.arange(end-start)
+    return depths
+
+
+def get_prevs(prev_index, rows):
+    """Predecessors of a batch of rows, as an array padded with -1"""
+    indptr, indices, _ = prev_index
+    rows = np.asarray(rows, dtype="int")
+    starts = indptr[rows]
+    counts = indptr[rows+1]-starts
+    slots = np.arange(max(1, counts.max(initial=0)))
+    in_row = slots < counts[:, None]
+    padded = np.append(indices, -1)
+    return padded[np.where(in_row, starts[:, None]+slots, len(indices))]
+
+
 def get_prev_func(graph):
-    node_ids = np.zeros(len(graph.sequences)+1)
-    node_ids[graph.node_offsets] = 1
-    node_ids = np.cumsum(node_ids)-1
-    reverse_adj_list = _get_reverse_adj_list(graph.adj_list)
+    indptr, indices, _ = get_prev_index(graph)
 
     def get_prev(i):
-        if i == 0:
-            return []
-        if node_ids[i-1] != node_ids[i]:
-            return [graph.node_offsets[prev_node+1]-1
-                    for prev_node in reverse_adj_list[node_ids[i]]]
-        return [i-1]
+        return list(indices[indptr[i]:indptr[i+1]])
 
     return get_prev
@@ -0,0 +1,133 @@
+import heapq
+from collections import defaultdict
+import numpy as np
+
+from .sequencegraph import get_prev_index, get_next_index, get_longest_depths
+
+MATCH, GAP_A, GAP_B = range(3)
+
+
+def _get_blocks(prev_index, next_index):
+    """First and last row of the linear block each row is in
+
+    Rows inside a block have the previous row as their only predecessor
+    and the next row as their only successor, so the block behaves like
+    a plain sequence.
+    """
+    n_rows = len(prev_index.is_linear)
+    rows = np.arange(n_rows)
+    continues = np.zeros(n_rows, dtype="bool")
+    continues[1:] = prev_index.is_linear[1:] & next_index.is_linear[:-1]
+    firsts = np.maximum.accumulate(np.where(continues, 0, rows))
+    ends = np.append(np.flatnonzero(~continues[1:]), n_rows-1)
+    lasts = ends[np.searchsorted(ends, rows)]
+    return firsts, lasts
+
+
+def get_wavefront_func(gap_open, score_matrix, gap_extend=None):
+    """Make a score-only global aligner for SequenceGraphs using wavefronts
+
+    Scores are turned into nonnegative penalties with a potential of half
+    the best score per position of the longest path to a cell, so that
+    best scoring matches are free and the penalty of any path is the best
+    possible score minus twice its score. Wavefronts of increasing penalty
+    are then extended along free matches. Inside blocks of linear rows and
+    columns only the furthest reaching cell of each diagonal is kept,
+    cells on the first row or column of a block are kept one by one.
+
+    The work grows with the number of cells scoring within the optimal
+    penalty, which is small for near-identical sequences.
+    """
+    if gap_extend is None:
+        gap_extend = gap_open
+    if gap_open > 0 or gap_extend > 0:
+        raise ValueError("Gap scores must be negative or zero")
+    score_matrix = np.asarray(score_matrix)
+    best = score_matrix.max().item()
+    scores = score_matrix.tolist()
+    is_free = score_matrix == best
+
+    def get_lookups(graph):
+        prev_index = get_prev_index(graph)
+        next_index = get_next_index(prev_index)
+        firsts, lasts = _get_blocks(prev_index, next_index)
+        return (np.asarray(graph.sequences, dtype="int"),
+                get_longest_depths(prev_index).tolist(),
+                next_index.indptr.tolist(), next_index.indices.tolist(),
+                firsts.tolist(), lasts.tolist())
+
+    def extend(seq_a, seq_b, i, j, length):
+        """Number of free matches following cell (i, j), at most length"""
+        done = 0
+        chunk = 32
+        while done < length:
+            size = min(chunk, length-done)
+            free = is_free[seq_a[i+done:i+done+size], seq_b[j+done:j+done+size]]
+            if not free.all():
+                return done+int(np.argmin(free))
+            done += size
+            chunk *= 2
+        return done
+
+    def wavefront_align(graph_a, graph_b):
+        seq_a, depths_a, indptr_a, next_a, firsts_a, lasts_a = get_lookups(graph_a)
+        seq_b, depths_b, indptr_b, next_b, firsts_b, lasts_b = get_lookups(graph_b)
+        chars_a, chars_b = (seq_a.tolist(), seq_b.tolist())
+        n, m = (len(chars_a), len(chars_b))
+        furthest = [{}, {}, {}]
+        seen = [set(), set(), set()]
+        pending = defaultdict(list)
+        penalties = [0]
+        pending[0].append((MATCH, 0, 0))
+        while penalties:
+            penalty = heapq.heappop(penalties)
+            points = pending.pop(penalty)
+
+            def push(k, i, j, new_penalty):
+                if new_penalty == penalty:
+                    points.append((k, i, j))
+                    return
+                if new_penalty not in pending:
+                    heapq.heappush(penalties, new_penalty)
+                pending[new_penalty].append((k, i, j))
+
+            while points:
+                k, i, j = points.pop()
+                first_a, first_b = (firsts_a[i], firsts_b[j])
+                if i == first_a or j == first_b:
+                    if (i, j) in seen[k]:
+                        continue
+                    seen[k].add((i, j))
+                else:
+                    diagonal = (first_a, first_b, (j-first_b)-(i-first_a))
+                    if furthest[k].get(diagonal, -1) >= i:
+                        continue
+                    if k == MATCH:
+                        length = extend(seq_a, seq_b, i, j,
+                                        min(lasts_a[i]-i, lasts_b[j]-j))
+                        i, j = (i+length, j+length)
+                    furthest[k][diagonal] = i
+                if k != MATCH:
+                    push(MATCH, i, j, penalty)
+                    gap_score = gap_extend
+                else:
+                    if (i, j) == (n, m):
+                        return (best*(depths_a[n]+depths_b[m])-penalty)/2
+                    gap_score = gap_open
+                nexts_a = next_a[indptr_a[i]:indptr_a[i+1]]
+                nexts_b = next_b[indptr_b[j]:indptr_b[j+1]]
+                if k != GAP_B:
+                    for next_i in nexts_a:
+                        step = best*(depths_a[next_i]-depths_a[i])
+                        push(GAP_A, next_i, j, penalty+step-2*gap_score)
+                        if k == MATCH:
+                            for next_j in nexts_b:
+                                steps = step+best*(depths_b[next_j]-depths_b[j])
+                                score = scores[chars_a[next_i-1]][chars_b[next_j-1]]
+                                push(MATCH, next_i, next_j, penalty+steps-2*score)
+                if k != GAP_A:
+                    for next_j in nexts_b:
+                        step = best*(depths_b[next_j]-depths_b[j])
+                        push(GAP_B, i, next_j, penalty+step-2*gap_score)
+
+    return wavefront_align
@@ -0,0 +1,127 @@
+from collections import namedtuple
+import numpy as np
+
+from graphalign.graphfile import save_graph, load_graph
+from .minimize import get_kmers, hash_kmers, minimize, window_minimizers
+
+MinimizerIndex = namedtuple("MinimizerIndex", ["k", "w", "hashes", "nodes", "offsets"])
+
+
+def _get_walks(graph, node_lengths, node, length, max_paths):
+    """Successor nodes of up to max_paths walks covering length bases after node
+
+    Walks stop early at nodes without successors.
+    """
+    walks = []
+    stack = [((), 0, node)]
+    while stack and len(walks) < max_paths:
+        path, covered, last = stack.pop()
+        next_nodes = list(graph.adj_list.get(last, ()))
+        if covered >= length or not next_nodes:
+            walks.append(path)
+            continue
+        for next_node in reversed(next_nodes):
+            stack.append((path+(next_node,), covered+node_lengths[next_node], next_node))
+    return walks
+
+
+def _get_strings(graph, node_offsets, node_ends, w, max_paths):
+    """Graph positions of each node, and of its last w-1 bases followed by each walk after it
+
+    Every window of w bases starting in a node lies in one of its
+    strings, as long as the node has at most max_paths such walks, and
+    the body of each node is only given once. Returns the concatenated
+    positions and the length of each string.
+    """
+    node_lengths = node_ends-node_offsets
+    pieces = []
+    lengths = []
+    for node, (start, end) in enumerate(zip(node_offsets, node_ends)):
+        pieces.append(np.arange(start, end))
+        lengths.append(end-start)
+        tail_start = max(start, end-w+1)
+        for walk in _get_walks(graph, node_lengths, node, w-1, max_paths):
+            if not walk:
+                continue
+            positions = np.concatenate([np.arange(tail_start, end)] +
+                                       [np.arange(node_offsets[n], node_ends[n]) for n in walk])
+            positions = positions[:end-tail_start+w-1]
+            pieces.append(positions)
+            lengths.append(len(positions))
+    if not pieces:
+        return np.zeros(0, dtype="int"), np.zeros(0, dtype="int")
+    return np.concatenate(pieces), np.array(lengths)
+
+
+def build_index(graph, k, w, max_paths=16):
+    """Index the window minimizers along all paths of a SequenceGraph
+
+    k-mers spanning node boundaries are found by extending each node with
+    the walks through its successors, and at most max_paths walks are
+    followed from each node. Paths shorter than w bases have no windows.
+    """
+    sequences = np.asarray(graph.sequences, dtype="uint8")
+    node_offsets = np.fromiter(graph.node_offsets, dtype="int")
+    node_ends = np.append(node_offsets[1:], len(sequences))
+    positions, lengths = _get_strings(graph, node_offsets, node_ends, w, max_paths)
+    hashes = hash_kmers(get_kmers(sequences[positions], k), k)
+    width = w-k+1
+    if len(hashes) < width:
+        return MinimizerIndex(k, w, np.zeros(0, dtype="uint64"),
+                              np.zeros(0, dtype="int"), np.zeros(0, dtype="int"))
+    # Windows must not run from one string into the next
+    string_ends = np.repeat(np.cumsum(lengths), lengths)
+    n_windows = len(hashes)-width+1
+    valid = string_ends[:n_windows] >= np.arange(n_windows)+w
+    found = window_minimizers(hashes, width, valid)
+    # The same position is found from the strings of several nodes
+    pairs = np.unique(np.stack((hashes[found], positions[found].astype("uint64")), axis=1), axis=0)
+    found_hashes, found_positions = (pairs[:, 0], pairs[:, 1].astype("int"))
+    nodes = np.searchsorted(node_offsets, found_positions, side="right")-1
+    return MinimizerIndex(k, w, found_hashes, nodes, found_positions-node_offsets[nodes])
+
+
+def lookup(index, hashes):
+    """Find all entries of the index with the given hashes
+
+    Returns which of the hashes each entry is for, and its node and offset.
+    """
+    hashes = np.asarray(hashes, dtype="uint64")
+    starts = np.searchsorted(index.hashes, hashes, side="left")
+    counts = np.searchsorted(index.hashes, hashes, side="right")-starts
+    entries = np.arange(counts.sum())+np.repeat(starts-np.cumsum(counts)+counts, counts)
+    return (np.repeat(np.arange(len(hashes)), counts),
+            index.nodes[entries], index.offsets[entries])
+
+
+def find_seeds(index, sequence):
+    """Minimizer matches of a 0-3 coded sequence, as (query pos, node, offset)"""
+    hashes, query_positions = minimize(np.asarray(sequence, dtype="uint8"), index.k, index.w)
+    which, nodes, offsets = lookup(index, hashes)
+    return query_positions[which], nodes, offsets
+
+
+def save_index(index, filename):
+    np.savez(filename, k=index.k, w=index.w, hashes=index.hashes,
+             nodes=index.nodes, offsets=index.offsets)
+
+
+def load_index(filename):
+    with np.load(filename) as data:
+        return MinimizerIndex(int(data["k"]), int(data["w"]), data["hashes"],
+                              data["nodes"], data["offsets"])
+
+
+def save_graph_index(filename, graph, index):
+    """Write a graph and its minimizer index to one binary graph file"""
+    save_graph(graph, filename, index_kw=np.array([index.k, index.w]),
+               index_hashes=index.hashes, index_nodes=index.nodes,
+               index_offsets=index.offsets)
+
+
+def load_graph_index(filename):
+    """Map a graph file written by save_graph_index, returning (graph, index)"""
+    graph, arrays = load_graph(filename)
+    k, w = arrays["index_kw"].tolist()
+    return graph, MinimizerIndex(k, w, arrays["index_hashes"], arrays["index_nodes"],
+                                 arrays["index_offsets"])
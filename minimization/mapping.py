@@ -0,0 +1,90 @@
+import logging
+import time
+from collections import namedtuple
+import numpy as np
+
+from graphalign import get_align_func, extract_subgraph, get_position_index
+from .graph_index import find_seeds
+
+Hit = namedtuple("Hit", ["read", "start", "end", "n_anchors", "chain_score", "score"])
+
+
+def chain_anchors(query_positions, graph_positions, k, max_gap=5000, lookback=50):
+    """Best chain of co-linear anchors, as indices into the anchors
+
+    Anchors are sorted by graph position, and each anchor is chained to
+    the best of the lookback anchors before it that come before it in
+    both the query and the graph, at most max_gap apart. An anchor adds
+    the new bases it covers, minus the difference of the gaps in the
+    query and in the graph. Returns the chain in order and its score.
+    """
+    order = np.lexsort((query_positions, graph_positions))
+    queries, targets = (query_positions[order], graph_positions[order])
+    n = len(order)
+    scores = np.full(n, k, dtype="float")
+    parents = np.full(n, -1)
+    for i in range(1, n):
+        lo = max(0, i-lookback)
+        dq, dg = (queries[i]-queries[lo:i], targets[i]-targets[lo:i])
+        gains = (np.minimum(np.minimum(dq, dg), k)-np.abs(dq-dg)).astype("float")
+        gains[(dq <= 0) | (dg <= 0) | (dq > max_gap) | (dg > max_gap)] = -np.inf
+        candidates = scores[lo:i]+gains
+        best = np.argmax(candidates)
+        if candidates[best] > k:
+            scores[i], parents[i] = (candidates[best], lo+best)
+    i = int(np.argmax(scores))
+    chain_score = scores[i]
+    chain = []
+    while i >= 0:
+        chain.append(order[i])
+        i = parents[i]
+    return np.array(chain[::-1]), chain_score
+
+
+def get_window_graph(graph, start, end, index=None):
+    """The part of a graph covering sequence positions start..end-1"""
+    return extract_subgraph(graph, start, end, index=index).graph
+
+
+def get_map_func(graph, index, gap_open, score_matrix, gap_extend=None,
+                 max_gap=5000, lookback=50):
+    """Make a read mapper against a graph with a minimizer index of it
+
+    Each read is seeded with the minimizers it shares with the index,
+    the seeds are chained, and the read is aligned with the affine
+    aligner to the part of the graph spanned by the best chain, extended
+    by the unchained ends of the read. The mapper returns the best Hit of
+    each read (None for reads without seeds) and the seconds spent in
+    each stage.
+    """
+    align = get_align_func(gap_open, score_matrix, gap_extend)
+    position_index = get_position_index(graph)
+    node_offsets, n_bases = position_index
+
+    def map_reads(reads):
+        timings = {"seed": 0.0, "chain": 0.0, "align": 0.0}
+        hits = []
+        for read_id, read in enumerate(reads):
+            t = time.perf_counter()
+            query_positions, nodes, offsets = find_seeds(index, read)
+            graph_positions = node_offsets[nodes]+offsets
+            timings["seed"] += time.perf_counter()-t
+            if not len(query_positions):
+                hits.append(None)
+                continue
+            t = time.perf_counter()
+            chain, chain_score = chain_anchors(query_positions, graph_positions, index.k,
+                                               max_gap, lookback)
+            first, last = (chain[0], chain[-1])
+            start = max(0, graph_positions[first]-query_positions[first])
+            end = min(n_bases, graph_positions[last]+len(read)-query_positions[last])
+            timings["chain"] += time.perf_counter()-t
+            t = time.perf_counter()
+            score = align(get_window_graph(graph, start, end, position_index), read)
+            timings["align"] += time.perf_counter()-t
+            hits.append(Hit(read_id, int(start), int(end), len(chain), chain_score, score))
+        logging.info("Mapped %s reads: %s", len(hits), ", ".join(
+            "%s %.2fs" % (stage, seconds) for stage, seconds in timings.items()))
+        return hits, timings
+
+    return map_reads
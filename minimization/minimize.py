@@ -1,4 +1,5 @@
 from collections import deque, namedtuple
+import numpy as np
 
 Minimizer = namedtuple("Minimizer", ["kmer", "pos"])
 
@@ -11,13 +12,11 @@ def minimize_func(k, w, hash_func):
         minimizers = [Minimizer(cur_min, i) for i in min_idxs]
         cur_min_count = len(min_idxs)
         for i in range(w-k+1, len(sequence)-k+1):
-            print("#", hashes)
             cur_hash = hashes.popleft()
             if cur_hash == cur_min:
                 cur_min_count -= 1
             new_hash = hash_func(sequence[i:i+k])
             hashes.append(new_hash)
-            # print(i, new_hash, cur_hash)
             if new_hash < cur_min:
                 cur_min = new_hash
                 cur_min_count = 1
@@ -36,6 +35,94 @@ def minimize_func(k, w, hash_func):
     return minimize
 
 
+def _check_k(k):
+    if not 1 <= k <= 32:
+        raise ValueError("k must be between 1 and 32 to pack k-mers in 64 bits, not %s" % k)
+
+
+def get_kmers(sequence, k):
+    """2-bit packed k-mers starting at each position of a 0-3 coded sequence"""
+    _check_k(k)
+    sequence = np.asarray(sequence, dtype="uint64")
+    n_kmers = max(len(sequence)-k+1, 0)
+    kmers = np.zeros(n_kmers, dtype="uint64")
+    for offset in range(k):
+        kmers <<= np.uint64(2)
+        kmers |= sequence[offset:offset+n_kmers]
+    return kmers
+
+
+def hash_kmers(kmers, k):
+    """Invertible integer hash of 2-bit packed k-mers, within 2k bits"""
+    _check_k(k)
+    mask = np.uint64((1 << 2*k)-1)
+    key = np.asarray(kmers, dtype="uint64")
+    key = (~key + (key << np.uint64(21))) & mask
+    key ^= key >> np.uint64(24)
+    key = (key + (key << np.uint64(3)) + (key << np.uint64(8))) & mask
+    key ^= key >> np.uint64(14)
+    key = (key + (key << np.uint64(2)) + (key << np.uint64(4))) & mask
+    key ^= key >> np.uint64(28)
+    key = (key + (key << np.uint64(31))) & mask
+    return key
+
+
+def _sliding(values, width, func):
+    """func.reduce over each window of width values, in O(n)
+
+    Values are split in blocks of width, and each window is combined from
+    a suffix of one block and a prefix of the next.
+    """
+    n_windows = len(values)-width+1
+    n_blocks = -(-len(values) // width)
+    padded = np.empty(n_blocks*width, dtype=values.dtype)
+    padded[:len(values)] = values
+    padded[len(values):] = values[-1]
+    blocks = padded.reshape(n_blocks, width)
+    prefix = func.accumulate(blocks, axis=1).ravel()
+    suffix = func.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    return func(suffix[:n_windows], prefix[width-1:width-1+n_windows])
+
+
+def window_minimizers(hashes, width, valid=None):
+    """Positions of the hashes that are smallest in at least one window
+
+    Windows are width consecutive hashes. With valid given, only the
+    windows starting where it is set count.
+    """
+    window_mins = _sliding(hashes, width, np.minimum)
+    if valid is not None:
+        window_mins = np.where(valid, window_mins, 0)
+    # A hash is a minimizer if it equals the largest minimum of the
+    # windows containing it, padding so that every hash sees width windows
+    padding = np.zeros(width-1, dtype=hashes.dtype)
+    best_mins = _sliding(np.concatenate((padding, window_mins, padding)), width, np.maximum)
+    is_minimizer = hashes == best_mins
+    if valid is not None:
+        padding = np.zeros(width-1, dtype="bool")
+        is_minimizer &= _sliding(np.concatenate((padding, valid, padding)), width, np.maximum)
+    return np.flatnonzero(is_minimizer)
+
+
+def minimize(sequence, k, w, hash_func=hash_kmers):
+    """Minimizers of all windows of w bases of a 0-3 coded sequence
+
+    Returns the hashes and positions of the k-mers that have the smallest
+    hash in at least one window, all of them in case of ties, sorted by
+    hash and position like minimize_func. With hash_func None the packed
+    k-mers themselves are used, and k can be at most 32.
+    """
+    _check_k(k)
+    kmers = get_kmers(sequence, k)
+    hashes = kmers if hash_func is None else hash_func(kmers, k)
+    if not len(hashes):
+        return hashes, np.zeros(0, dtype="int")
+    positions = window_minimizers(hashes, min(w-k+1, len(hashes)))
+    order = np.lexsort((positions, hashes[positions]))
+    return hashes[positions[order]], positions[order]
+
+
 if __name__ == "__main__":
     f = minimize_func(2, 4, lambda x: x)
     print(f([1, 2, 3, 0, 1, 2, 2, 3, 1]))
+    print(minimize(np.array([1, 2, 3, 0, 1, 2, 2, 3, 1], dtype="uint8"), 2, 4, hash_func=None))
@@ -0,0 +1,14 @@
+import pytest
+
+from graphalign import SequenceGraph
+
+
+@pytest.fixture
+def snp_graph():
+    return SequenceGraph([0, 1, 2, 3, 0], [0, 2, 3, 4], {0: [1, 2], 1: [3], 2: [3]})
+
+
+@pytest.fixture
+def long_snp_graph():
+    return SequenceGraph([0, 1, 2, 3, 0, 1, 2, 2, 3, 1, 0, 3],
+                         [0, 4, 5, 6], {0: [1, 2], 1: [3], 2: [3]})
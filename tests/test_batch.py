@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from graphalign import BatchAligner, get_align_func, get_score_mat
+
+
+@pytest.fixture
+def queries():
+    return [[0, 1, 3, 0], [0, 1, 2, 0], [0, 1, 1, 0], [0, 0], [3, 2, 1, 0, 1]]
+
+
+def test_align_many(snp_graph, queries):
+    align = get_align_func(-3, get_score_mat(-1), -1)
+    scores = BatchAligner(snp_graph, -3, get_score_mat(-1), -1).align_many(queries)
+    assert scores.dtype == np.float64
+    assert scores.tolist() == [align(snp_graph, query) for query in queries]
+
+
+def test_align_many_seqs(snp_graph, queries):
+    align = get_align_func(-3, get_score_mat(-1), -1, return_seq=True)
+    aligner = BatchAligner(snp_graph, -3, get_score_mat(-1), -1, return_seq=True)
+    alignments_a, alignments_b, scores = aligner.align_many(queries)
+    assert list(zip(alignments_a, alignments_b, scores)) == [align(snp_graph, query)
+                                                           for query in queries]
+
+
+def test_align_many_banded(snp_graph, queries):
+    aligner = BatchAligner(snp_graph, -3, get_score_mat(-1), -1, band=3, dtype="int32")
+    scores, cut_offs = aligner.align_many(queries)
+    assert scores.dtype == np.int32
+    assert cut_offs.dtype == bool
+
+
+def test_align_many_parallel(snp_graph, queries):
+    serial = BatchAligner(snp_graph, -3, get_score_mat(-1), -1, return_seq=True)
+    parallel = BatchAligner(snp_graph, -3, get_score_mat(-1), -1, return_seq=True,
+                            n_workers=2, chunk_size=2)
+    for expected, result in zip(serial.align_many(queries*3), parallel.align_many(queries*3)):
+        assert expected.tolist() == result.tolist()
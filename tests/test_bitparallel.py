@@ -0,0 +1,39 @@
+import numpy as np
+
+from graphalign import get_align_func, get_score_mat
+from graphalign.bitparallel import edit_distance, get_score_bound_func
+
+
+def simple_edit_distance(seq_a, seq_b):
+    row = np.arange(len(seq_b)+1)
+    for i, c in enumerate(seq_a, 1):
+        new_row = [i]
+        for j, d in enumerate(seq_b, 1):
+            new_row.append(min(row[j]+1, new_row[j-1]+1, row[j-1]+(c != d)))
+        row = np.array(new_row)
+    return row[-1]
+
+
+def test_edit_distance():
+    rng = np.random.default_rng(0)
+    for length in (0, 1, 10, 70, 130):
+        a = list(rng.integers(0, 4, length))
+        b = list(rng.integers(0, 4, 100))
+        assert edit_distance(a, b) == simple_edit_distance(a, b)
+        assert edit_distance(b, a) == simple_edit_distance(b, a)
+
+
+def test_edit_distance_graph(snp_graph):
+    assert edit_distance(snp_graph, [0, 1, 3, 0]) == 0
+    assert edit_distance(snp_graph, [0, 1, 2, 0]) == 0
+    assert edit_distance(snp_graph, [0, 1, 1, 0]) == 1
+    assert edit_distance(snp_graph, [0, 0]) == 2
+    assert edit_distance(snp_graph, []) == 4
+
+
+def test_score_bound(snp_graph):
+    align = get_align_func(-3, get_score_mat(-1), -1, mode="wfa")
+    score_bound = get_score_bound_func(-3, get_score_mat(-1), -1)
+    for query in ([0, 1, 3, 0], [0, 1, 1, 0], [0, 0], [1, 2, 3, 0, 1, 2]):
+        assert score_bound(snp_graph, query) >= align(snp_graph, query)
+    assert score_bound(snp_graph, [0, 1, 3, 0]) == 4
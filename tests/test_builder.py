@@ -1,6 +1,7 @@
 import pytest
 
-from graphalign.builder import GraphBuilder, BuilderStruct, GraphMerger
+from graphalign.builder import (GraphBuilder, BuilderStruct, GraphMerger, Variant, merge_graphs,
+                               build_progressive_graph, map_interval)
 from graphalign import *
 
 
@@ -99,3 +100,95 @@ def test_snp_merge(merge_input):
     print("#", merge_input._adj_list)
     true_top = GraphBuilder(true_nodes, true_adj).to_topology()
     assert merge_input.to_topology() == true_top
+
+
+def test_debug_mode(short_ref):
+    builder = GraphBuilder({0: short_ref[:4], 1: short_ref[4:]}, {0: [1]}, debug=True)
+    builder.add_snp((0, 2), 1)
+    del builder._reverse_adj_list[3][2]
+    with pytest.raises(AssertionError):
+        builder.add_edge(4, 1)
+    builder.debug = False
+    builder.add_edge(3, 2)
+
+
+def test_add_variants(short_ref):
+    builder = GraphBuilder({0: list(short_ref)}, {})
+    segments = builder.add_variants(0, [Variant(1, 1, [3]), Variant(3, 2, []), Variant(6, 0, [0, 0])])
+    assert segments == [0, 1, 2, 3, 4, 5]
+    nodes = {0: [0], 1: [1], 2: [2], 3: [3, 3], 4: [2], 5: [1, 0], 6: [3], 7: [0, 0]}
+    adj_list = {0: [1, 6], 1: [2], 2: [3, 4], 3: [4], 4: [5, 7], 6: [2], 7: [5]}
+    assert builder.to_struct() == BuilderStruct(nodes, adj_list)
+
+
+def test_add_snps_matches_add_snp(short_ref):
+    builder = GraphBuilder({0: list(short_ref)}, {})
+    builder.add_snps(0, [2, 5], [0, 3])
+    single = GraphBuilder({0: list(short_ref)}, {})
+    next_node = single.add_snp(Position(0, 2), 0)
+    single.add_snp(Position(next_node, 2), 3)
+    assert builder.to_topology() == single.to_topology()
+
+
+def test_merge_graphs(short_ref, short_ref2):
+    graph_a = SequenceGraph(short_ref, [0, 4], {0: [1]})
+    graph_b = SequenceGraph(short_ref2, [0], {})
+    graph = merge_graphs(graph_a, graph_b, [Interval(2, 2, [0, 1])], [Interval(2, 6, [0])])
+    assert sorted(graph.sequences) == sorted(short_ref+short_ref2[:2]+short_ref2[6:])
+    assert len(graph.node_offsets) == 6
+
+
+def test_progressive_graph():
+    sequences = [[0, 1, 2, 3, 0, 1, 2, 3, 0, 1],
+                 [0, 1, 2, 3, 2, 1, 2, 3, 0, 1],
+                 [0, 1, 2, 3, 1, 2, 3, 0, 1],
+                 [0, 1, 2, 3, 0, 1, 3, 3, 2, 3, 0, 1]]
+    builder = build_progressive_graph(sequences, -2, get_score_mat(-1))
+    assert sum(len(seq) for seq in builder._nodes.values()) == 13
+    graph = builder.to_sequence_graph()
+    spelled = set()
+    stack = [(0, ())]
+    ends = graph.node_offsets[1:] + [len(graph.sequences)]
+    while stack:
+        node, seq = stack.pop()
+        seq += tuple(graph.sequences[graph.node_offsets[node]:ends[node]])
+        if not graph.adj_list.get(node):
+            spelled.add(seq)
+        stack.extend((next_node, seq) for next_node in graph.adj_list.get(node, ()))
+    assert {tuple(seq) for seq in sequences} <= spelled
+
+
+def test_cached_export(short_ref):
+    builder = GraphBuilder({0: list(short_ref)}, {}, debug=True)
+    graph = builder.to_sequence_graph()
+    assert builder.to_sequence_graph() is graph
+    builder.add_snp(Position(0, 3), 2)
+    builder.add_insertion(Position(2, 2), [1, 1])
+    builder.add_variants(0, [Variant(1, 1, [])])
+    graph, order = builder._export()
+    rank = {node: i for i, node in enumerate(order)}
+    assert sorted(order) == sorted(builder._nodes)
+    assert all(rank[from_node] < rank[to_node]
+               for from_node, to_nodes in builder._adj_list.items() for to_node in to_nodes)
+    assert sorted(graph.sequences) == sorted(short_ref+[2, 1, 1])
+
+
+def test_cycle(short_ref):
+    builder = GraphBuilder({0: short_ref[:4], 1: short_ref[4:]}, {0: [1]})
+    builder.to_sequence_graph()
+    builder.add_edge(1, 0)
+    with pytest.raises(ValueError):
+        builder.to_sequence_graph()
+
+
+def test_compact():
+    builder = GraphBuilder({0: [0, 1], 1: [2, 3], 2: [1], 3: [0], 4: [2, 2]},
+                           {0: [1], 1: [2, 3], 2: [4], 3: [4]}, debug=True)
+    builder.to_sequence_graph()
+    node_map = builder.compact()
+    assert builder._nodes == {0: [0, 1, 2, 3], 2: [1], 3: [0], 4: [2, 2]}
+    assert builder.to_struct().adj_list == {0: [2, 3], 2: [4], 3: [4]}
+    assert node_map.nodes.tolist() == [0, 0, 2, 3, 4]
+    assert node_map.offsets.tolist() == [0, 2, 0, 0, 0]
+    assert map_interval(Interval(1, 1, [0, 1, 2]), node_map) == Interval(1, 1, [0, 2])
+    assert builder.to_sequence_graph().node_offsets == [0, 4, 5, 6]
@@ -0,0 +1,87 @@
+import pytest
+
+from graphalign.construct import read_fasta, read_vcf, construct_graph
+from graphalign.builder import Variant
+from graphalign.gfa import read_gfa
+
+FASTA = ">chr1 test\nACGTACGTAC\nGTACGT\n>chr2\nTTTTGGGG\n"
+VCF = """##fileformat=VCFv4.2
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO
+chr1\t2\t.\tC\tG,T\t.\t.\t.
+chr1\t5\t.\tACG\tA\t.\t.\t.
+chr1\t12\t.\tT\tTAA,<DEL>\t.\t.\t.
+chr2\t4\t.\tT\tC\t.\t.\t.
+"""
+
+
+def get_haplotypes(graph):
+    ends = graph.node_offsets[1:] + [len(graph.sequences)]
+    has_prev = {node for nodes in graph.adj_list.values() for node in nodes}
+    haplotypes = set()
+    stack = [(node, ()) for node in range(len(graph.node_offsets)) if node not in has_prev]
+    while stack:
+        node, seq = stack.pop()
+        seq = seq + tuple(graph.sequences[graph.node_offsets[node]:ends[node]].tolist())
+        if not graph.adj_list.get(node):
+            haplotypes.add(seq)
+        stack.extend((next_node, seq) for next_node in graph.adj_list.get(node, ()))
+    return haplotypes
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    (tmp_path / "ref.fa").write_text(FASTA)
+    (tmp_path / "vars.vcf").write_text(VCF)
+    return tmp_path / "ref.fa", tmp_path / "vars.vcf"
+
+
+def test_read_fasta(inputs):
+    chunks = list(read_fasta(inputs[0], chunk_size=4))
+    assert [name for name, _ in chunks] == ["chr1", "chr1", "chr2"]
+    assert sum(len(chunk) for name, chunk in chunks if name == "chr1") == 16
+
+
+def test_read_vcf(inputs):
+    assert list(read_vcf(inputs[1])) == [
+        ("chr1", Variant(1, 1, [2])), ("chr1", Variant(1, 1, [3])),
+        ("chr1", Variant(5, 2, [])), ("chr1", Variant(12, 0, [0, 0])),
+        ("chr2", Variant(3, 1, [1]))]
+
+
+@pytest.mark.parametrize("region_size", [1, 3, 100])
+def test_construct_graph(inputs, tmp_path, region_size):
+    progress = []
+    total = construct_graph(*inputs, tmp_path / "graph.gfa", region_size=region_size,
+                            progress=progress.append)
+    assert (total.bases, total.variants) == (24, 5)
+    assert progress[-1].bases == 24
+    graph = read_gfa(tmp_path / "graph.gfa").graph
+    chr1 = [0, 1, 2, 3]*4
+    haplotypes = {tuple(chr1[:1]+[snp]+chr1[2:5]+deletion+chr1[7:12]+insertion+chr1[12:])
+                  for snp in (1, 2, 3) for deletion in ([], [1, 2]) for insertion in ([], [0, 0])}
+    haplotypes |= {(3, 3, 3, 3, 2, 2, 2, 2), (3, 3, 3, 1, 2, 2, 2, 2)}
+    assert get_haplotypes(graph) == haplotypes
+
+
+def test_variant_outside_reference(inputs, tmp_path):
+    (tmp_path / "bad.vcf").write_text("chr2\t20\t.\tT\tC\t.\t.\t.\n")
+    with pytest.raises(ValueError):
+        construct_graph(inputs[0], tmp_path / "bad.vcf", tmp_path / "graph.gfa")
+
+
+def test_unknown_bases(tmp_path):
+    (tmp_path / "ref.fa").write_text(">chr1\nACGTNNNNACGT\n")
+    (tmp_path / "vars.vcf").write_text("chr1\t2\t.\tC\tG\t.\t.\t.\n")
+    with pytest.raises(ValueError, match="chr1:5"):
+        construct_graph(tmp_path / "ref.fa", tmp_path / "vars.vcf", tmp_path / "graph.gfa")
+    total = construct_graph(tmp_path / "ref.fa", tmp_path / "vars.vcf", tmp_path / "graph.gfa",
+                            unknown_base=0)
+    assert (total.bases, total.variants) == (12, 1)
+
+
+@pytest.mark.parametrize("records", ["chr1\t2\t.\tG\tT\t.\t.\t.\n",
+                                     "chr1\t5\t.\tA\tT\t.\t.\t.\nchr1\t2\t.\tC\tG\t.\t.\t.\n"])
+def test_bad_vcf(inputs, tmp_path, records):
+    (tmp_path / "bad.vcf").write_text(records)
+    with pytest.raises(ValueError):
+        construct_graph(inputs[0], tmp_path / "bad.vcf", tmp_path / "graph.gfa")
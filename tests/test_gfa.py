@@ -0,0 +1,75 @@
+import pytest
+import numpy as np
+
+from graphalign import SequenceGraph
+from graphalign.gfa import read_gfa, read_gfa_builder, write_gfa
+
+GFA_TEXT = """H\tVN:Z:1.0
+S\tb\tA
+L\ta\t+\tb\t+\t0M
+L\ta\t+\tc\t+\t0M
+S\ta\tacgt
+L\tb\t+\td\t+\t0M
+L\tc\t+\td\t+\t0M
+S\tc\tG
+S\td\tCGTACT
+P\tref\ta+,b+,d+\t*
+"""
+
+
+@pytest.fixture
+def gfa_file(tmp_path):
+    filename = tmp_path / "graph.gfa"
+    filename.write_text(GFA_TEXT)
+    return filename
+
+
+def test_read_gfa(gfa_file):
+    graph, names, paths = read_gfa(gfa_file)
+    assert names == ["a", "b", "c", "d"]
+    assert sorted(graph.sequences.tolist()) == sorted([0, 1, 2, 3, 0, 2, 1, 2, 3, 0, 1, 3])
+    assert graph.node_offsets == [0, 4, 5, 6]
+    assert graph.adj_list == {0: [1, 2], 1: [3], 2: [3]}
+    assert paths == {"ref": [0, 1, 3]}
+
+
+def test_read_gfa_builder(gfa_file):
+    builder, names, paths = read_gfa_builder(gfa_file)
+    assert names == ["b", "a", "c", "d"]
+    assert all(sequence.dtype == np.uint8 for sequence in builder._nodes.values())
+    assert {node: sequence.tolist() for node, sequence in builder._nodes.items()} == \
+        {0: [0], 1: [0, 1, 2, 3], 2: [2], 3: [1, 2, 3, 0, 1, 3]}
+    assert paths == {"ref": [1, 0, 3]}
+    assert builder == read_gfa_builder(gfa_file).graph
+    assert builder.to_topology()
+    graph = builder.to_sequence_graph()
+    assert graph.sequences.dtype == np.uint8
+    assert sorted(graph.sequences.tolist()) == sorted([0, 1, 2, 3, 0, 2, 1, 2, 3, 0, 1, 3])
+
+
+def test_roundtrip(gfa_file, tmp_path):
+    graph, names, paths = read_gfa(gfa_file)
+    write_gfa(graph, tmp_path / "out.gfa", names, paths)
+    new_graph, new_names, new_paths = read_gfa(tmp_path / "out.gfa")
+    assert new_graph.sequences.tolist() == graph.sequences.tolist()
+    assert new_graph.node_offsets == graph.node_offsets
+    assert new_graph.adj_list == graph.adj_list
+    assert (new_names, new_paths) == (names, paths)
+
+
+def test_write_gfa(tmp_path):
+    graph = SequenceGraph([0, 1, 2, 3], [0, 2, 3], {0: [1, 2], 1: [2]})
+    write_gfa(graph, tmp_path / "out.gfa")
+    assert (tmp_path / "out.gfa").read_text().splitlines()[1:] == [
+        "S\t1\tAC", "S\t2\tG", "S\t3\tT",
+        "L\t1\t+\t2\t+\t0M", "L\t1\t+\t3\t+\t0M", "L\t2\t+\t3\t+\t0M"]
+
+
+def test_unsupported(tmp_path):
+    for text in ("S\ta\tACGT\nS\tb\tA\nL\ta\t+\tb\t-\t0M\n",
+                 "S\ta\tACGT\nS\tb\tA\nL\ta\t+\tb\t+\t2M\n",
+                 "S\ta\tACNT\n",
+                 "S\ta\tACGT\nL\ta\t+\tb\t+\t0M\n"):
+        (tmp_path / "bad.gfa").write_text(text)
+        with pytest.raises(ValueError):
+            read_gfa(tmp_path / "bad.gfa")
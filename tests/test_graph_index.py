@@ -0,0 +1,61 @@
+import numpy as np
+
+from graphalign import SequenceGraph
+from minimization.graph_index import (build_index, lookup, find_seeds, save_index, load_index,
+                                      save_graph_index, load_graph_index, _get_strings)
+from minimization.minimize import minimize
+
+
+def test_linear_graph():
+    sequence = np.random.default_rng(0).integers(0, 4, 100).astype("uint8")
+    graph = SequenceGraph(sequence, [0, 30, 31, 70], {0: [1], 1: [2], 2: [3]})
+    index = build_index(graph, 5, 11)
+    hashes, positions = minimize(sequence, 5, 11)
+    assert index.hashes.tolist() == hashes.tolist()
+    node_offsets = np.array([0, 30, 31, 70])
+    assert (node_offsets[index.nodes]+index.offsets).tolist() == positions.tolist()
+
+
+def test_snp_graph(long_snp_graph):
+    index = build_index(long_snp_graph, 3, 4)
+    for path in ([0, 1, 2, 3, 4, 6, 7, 8, 9, 10, 11], [0, 1, 2, 3, 5, 6, 7, 8, 9, 10, 11]):
+        query = [long_snp_graph.sequences[i] for i in path]
+        query_positions, nodes, offsets = find_seeds(index, query)
+        seeds = set(zip(query_positions, np.array([0, 4, 5, 6])[nodes]+offsets))
+        expected = {(pos, path[pos]) for pos in minimize(np.array(query), 3, 4)[1]}
+        assert expected <= seeds
+
+
+def test_lookup(long_snp_graph):
+    index = build_index(long_snp_graph, 3, 4)
+    which, nodes, offsets = lookup(index, [index.hashes[0], np.uint64(2**40)])
+    assert which.tolist() == [0]*np.sum(index.hashes == index.hashes[0])
+    assert (nodes[0], offsets[0]) == (index.nodes[0], index.offsets[0])
+
+
+def test_save_load(long_snp_graph, tmp_path):
+    index = build_index(long_snp_graph, 3, 4)
+    save_index(index, tmp_path / "index.npz")
+    loaded = load_index(tmp_path / "index.npz")
+    assert (loaded.k, loaded.w) == (3, 4)
+    for a, b in zip(index[2:], loaded[2:]):
+        assert a.tolist() == b.tolist()
+
+
+def test_save_graph_index(long_snp_graph, tmp_path):
+    index = build_index(long_snp_graph, 3, 4)
+    save_graph_index(tmp_path / "graph.bin", long_snp_graph, index)
+    graph, loaded = load_graph_index(tmp_path / "graph.bin")
+    assert (loaded.k, loaded.w) == (index.k, index.w)
+    for name in ("hashes", "nodes", "offsets"):
+        assert getattr(loaded, name).tolist() == getattr(index, name).tolist()
+    assert list(graph.sequences) == long_snp_graph.sequences
+
+
+def test_strings_give_node_bodies_once(long_snp_graph):
+    node_offsets = np.array(long_snp_graph.node_offsets)
+    node_ends = np.append(node_offsets[1:], len(long_snp_graph.sequences))
+    positions, lengths = _get_strings(long_snp_graph, node_offsets, node_ends, 3, 16)
+    assert lengths.tolist() == [4, 4, 4, 1, 3, 1, 3, 6]
+    assert positions[4:12].tolist() == [2, 3, 4, 6, 2, 3, 5, 6]
+    assert np.count_nonzero(positions == 0) == 1
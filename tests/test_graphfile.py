@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from graphalign import CompactSequenceGraph, save_graph, load_graph, get_align_func
+from graphalign.graphfile import VERSION, GRAPH_ARRAYS
+
+
+def test_roundtrip(long_snp_graph, tmp_path):
+    filename = tmp_path / "graph.bin"
+    save_graph(long_snp_graph, filename)
+    loaded, extra = load_graph(filename)
+    assert isinstance(loaded, CompactSequenceGraph)
+    assert not any(getattr(loaded, name).flags.owndata for name in GRAPH_ARRAYS)
+    assert extra == {}
+    assert list(loaded.sequences) == long_snp_graph.sequences
+    assert list(loaded.node_offsets) == long_snp_graph.node_offsets
+    assert {node: list(nodes) for node, nodes in loaded.adj_list.items()} == long_snp_graph.adj_list
+    align = get_align_func(-2, np.where(np.eye(4), 2, -1))
+    query = [0, 1, 2, 3, 1, 2, 2, 3, 1, 0]
+    assert align(loaded, query) == align(long_snp_graph, query)
+
+
+def test_extra_arrays(long_snp_graph, tmp_path):
+    filename = tmp_path / "graph.bin"
+    hashes = np.arange(10, dtype="uint64")
+    save_graph(long_snp_graph, filename, hashes=hashes, empty=np.zeros(0, dtype="int32"))
+    _, extra = load_graph(filename)
+    assert extra["hashes"].dtype == hashes.dtype
+    assert extra["hashes"].tolist() == hashes.tolist()
+    assert extra["empty"].dtype == np.dtype("int32") and len(extra["empty"]) == 0
+
+
+def test_bad_file(long_snp_graph, tmp_path):
+    filename = tmp_path / "graph.bin"
+    save_graph(long_snp_graph, filename)
+    data = bytearray(filename.read_bytes())
+    data[8] = VERSION+1
+    filename.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        load_graph(filename)
+    filename.write_bytes(b"not a graph file at all")
+    with pytest.raises(ValueError):
+        load_graph(filename)
+
+
+def test_bad_extra_arrays(long_snp_graph, tmp_path):
+    filename = tmp_path / "graph.bin"
+    for extra in ({"a_name_longer_than_24_bytes": np.zeros(3)}, {"sequences": np.zeros(3)},
+                  {"table": np.zeros((2, 3))}, {"objects": np.array([None, 1])}):
+        with pytest.raises(ValueError):
+            save_graph(long_snp_graph, filename, **extra)
+
+
+def test_truncated_file(long_snp_graph, tmp_path):
+    filename = tmp_path / "graph.bin"
+    save_graph(long_snp_graph, filename)
+    data = filename.read_bytes()
+    for size in (4, 40, len(data)//2):
+        filename.write_bytes(data[:size])
+        with pytest.raises(ValueError):
+            load_graph(filename)
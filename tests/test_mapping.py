@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from graphalign import get_score_mat, SequenceGraph
+from minimization.graph_index import build_index
+from minimization.mapping import chain_anchors, get_map_func, get_window_graph
+
+
+@pytest.fixture
+def reference():
+    sequence = np.random.default_rng(1).integers(0, 4, 3000)
+    # Add an alternative allele after position 1500
+    sequences = np.concatenate((sequence[:1500], [(sequence[1500]+1) % 4], sequence[1500:]))
+    graph = SequenceGraph(sequences, [0, 1500, 1501, 1502],
+                          {0: [1, 2], 1: [3], 2: [3]})
+    return sequence, graph
+
+
+def test_chain_anchors():
+    query_positions = np.array([0, 10, 20, 5, 30])
+    graph_positions = np.array([100, 110, 121, 900, 130])
+    chain, score = chain_anchors(query_positions, graph_positions, 5)
+    assert chain.tolist() == [0, 1, 2, 4]
+    assert score == 5*4-2
+
+
+def test_window_graph(reference):
+    _, graph = reference
+    window = get_window_graph(graph, 1490, 1510)
+    assert window.node_offsets == [0, 10, 11, 12]
+    assert window.adj_list == {0: [1, 2], 1: [3], 2: [3], 3: []}
+    assert len(window.sequences) == 20
+
+
+def test_map_reads(reference):
+    sequence, graph = reference
+    rng = np.random.default_rng(2)
+    starts = [100, 1450, 2500]
+    reads = []
+    for start in starts:
+        read = sequence[start:start+150].copy()
+        errors = rng.integers(0, 150, 3)
+        read[errors] = (read[errors]+1) % 4
+        reads.append(read)
+    map_reads = get_map_func(graph, build_index(graph, 11, 20), -3, get_score_mat(-1), -1)
+    hits, timings = map_reads(reads + [np.zeros(0, dtype="int")])
+    assert set(timings) == {"seed", "chain", "align"}
+    assert hits[-1] is None
+    for start, hit in zip(starts, hits):
+        offset = 1 if start > 1500 else 0
+        assert abs(hit.start-start-offset) <= 2
+        assert hit.score >= 150-3*4
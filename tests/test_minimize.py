@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from minimization.minimize import minimize, minimize_func, get_kmers, hash_kmers
+
+
+def test_minimize_example():
+    sequence = [1, 2, 3, 0, 1, 2, 2, 3, 1]
+    expected = minimize_func(2, 4, lambda x: x)(sequence)
+    hashes, positions = minimize(np.array(sequence, dtype="uint8"), 2, 4, hash_func=None)
+    assert positions.tolist() == [m.pos for m in expected]
+    assert hashes.tolist() == [get_kmers(m.kmer, 2)[0] for m in expected]
+
+
+def test_minimize_random():
+    rng = np.random.default_rng(0)
+    sequence = rng.integers(0, 4, 200).astype("uint8")
+    expected = sorted(set(minimize_func(5, 11, lambda x: int(hash_kmers(get_kmers(x, 5), 5)[0]))(
+        list(sequence))))
+    hashes, positions = minimize(sequence, 5, 11)
+    assert list(zip(hashes.tolist(), positions.tolist())) == expected
+
+
+def test_hash_kmers_invertible():
+    hashes = hash_kmers(np.arange(4**6, dtype="uint64"), 6)
+    assert np.unique(hashes).size == 4**6
+    assert hashes.max() < 4**6
+
+
+@pytest.mark.parametrize("k", [0, 33])
+def test_bad_k(k):
+    sequence = np.zeros(40, dtype="uint8")
+    with pytest.raises(ValueError):
+        get_kmers(sequence, k)
+    with pytest.raises(ValueError):
+        minimize(sequence, k, 40)
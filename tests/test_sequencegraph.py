@@ -0,0 +1,108 @@
+import numpy as np
+
+from graphalign.sequencegraph import (SequenceGraph, CompactSequenceGraph, naive_graph,
+                                      get_prev_index, get_prevs, get_prev_func,
+                                      get_next_index, compact_graph,
+                                      alignment_to_sequencegraph, get_position_index,
+                                      get_node_positions, get_linear_positions, extract_subgraph)
+
+
+def test_prev_index_linear():
+    indptr, indices, is_linear = get_prev_index(naive_graph([0, 1, 2, 3, 0, 1, 2]))
+    assert indptr.tolist() == [0] + list(range(8))
+    assert indices.tolist() == list(range(7))
+    assert is_linear.tolist() == [False] + [True]*7
+
+
+def test_prev_index_snp(snp_graph):
+    prev_index = get_prev_index(snp_graph)
+    assert prev_index.is_linear.tolist() == [False, True, True, True, False, False]
+    assert get_prevs(prev_index, [5, 4, 1]).tolist() == [[3, 4], [2, -1], [0, -1]]
+
+
+def test_prev_func(snp_graph):
+    get_prev = get_prev_func(snp_graph)
+    assert get_prev(0) == []
+    assert get_prev(3) == [2]
+    assert get_prev(5) == [3, 4]
+
+
+def test_next_index(snp_graph):
+    indptr, indices, is_linear = get_next_index(get_prev_index(snp_graph))
+    assert indptr.tolist() == [0, 1, 2, 4, 5, 6, 6]
+    assert indices.tolist() == [1, 2, 3, 4, 5, 5]
+    assert is_linear.tolist() == [True, True, False, False, True, False]
+
+
+def test_compact_graph(snp_graph):
+    graph = CompactSequenceGraph.from_graph(snp_graph)
+    assert graph.sequences.dtype == "uint8"
+    assert graph.node_offsets.dtype == "int64"
+    assert dict(graph.adj_list) == snp_graph.adj_list
+    assert dict(graph.reverse_adj_list) == {1: [0], 2: [0], 3: [1, 2]}
+    assert 3 not in graph.adj_list
+    assert naive_graph(graph) is graph
+    for compact, original in zip(get_prev_index(graph), get_prev_index(snp_graph)):
+        assert compact.tolist() == original.tolist()
+    assert get_prev_func(graph)(5) == [3, 4]
+
+
+def test_compact_graph_from_csr(snp_graph):
+    graph = CompactSequenceGraph([0, 1, 2, 3, 0], [0, 2, 3, 4], [0, 2, 3, 4, 4], [1, 2, 3, 3])
+    assert graph.rev_indptr.tolist() == [0, 0, 1, 2, 4]
+    assert graph.rev_indices.tolist() == [0, 0, 1, 2]
+    sequences, node_offsets, adj_list = graph
+    assert dict(adj_list) == snp_graph.adj_list
+
+
+def test_compact_graph_paths():
+    graph = SequenceGraph([0, 1, 2, 3, 0, 1, 2, 2, 3, 1, 0, 3],
+                          [0, 2, 4, 5, 6, 9], {0: [1], 1: [2, 3], 2: [4], 3: [4], 4: [5]})
+    compacted, node_map = compact_graph(graph)
+    assert compacted == SequenceGraph([0, 1, 2, 3, 0, 1, 2, 2, 3, 1, 0, 3],
+                                      [0, 4, 5, 6], {0: [1, 2], 1: [3], 2: [3]})
+    assert node_map.nodes.tolist() == [0, 0, 1, 2, 3, 3]
+    assert node_map.offsets.tolist() == [0, 2, 0, 0, 0, 3]
+    compacted, _ = compact_graph(CompactSequenceGraph.from_graph(graph))
+    assert isinstance(compacted, CompactSequenceGraph)
+    assert compacted.node_offsets.tolist() == [0, 4, 5, 6]
+
+
+def test_compact_naive_graph():
+    graph = naive_graph([0, 1, 2, 3, 0, 1, 2, 3, 0])
+    assert graph.node_offsets == [0]
+    compacted, node_map = compact_graph(graph)
+    assert compacted.node_offsets == [0]
+    assert node_map.offsets.tolist() == [0]
+    assert naive_graph([]).node_offsets == []
+
+
+def test_alignment_to_sequencegraph():
+    graph = alignment_to_sequencegraph(("ACG-TTA", "ACGCTAA", 0.0))
+    assert graph.sequences.tolist() == [0, 1, 2, 1, 3, 3, 0, 0]
+    assert graph.node_offsets.tolist() == [0, 3, 4, 5, 6, 7]
+    assert dict(graph.adj_list) == {0: [1, 2], 1: [2], 2: [3, 4], 3: [5], 4: [5]}
+    assert alignment_to_sequencegraph(("", "")).node_offsets.tolist() == []
+
+
+def test_position_index():
+    graph = SequenceGraph([0, 1, 2, 3, 0, 1, 2, 2, 3], [0, 2, 4, 5, 6], {0: [1], 1: [2, 3], 2: [4], 3: [4]})
+    index = get_position_index(graph)
+    nodes, offsets = get_node_positions(index, [0, 3, 4, 8])
+    assert nodes.tolist() == [0, 1, 2, 4]
+    assert offsets.tolist() == [0, 1, 0, 2]
+    assert get_linear_positions(index, nodes, offsets).tolist() == [0, 3, 4, 8]
+
+
+def test_extract_subgraph():
+    graph = SequenceGraph(np.array([0, 1, 2, 3, 0, 1, 2, 2, 3]), [0, 2, 4, 5, 6],
+                          {0: [1], 1: [2, 3], 2: [4], 3: [4]})
+    subgraph = extract_subgraph(graph, 4, 6, context=1)
+    assert (subgraph.start, subgraph.first_node) == (3, 1)
+    assert subgraph.graph.sequences.tolist() == [3, 0, 1, 2]
+    assert subgraph.graph.node_offsets == [0, 1, 2, 3]
+    assert subgraph.graph.adj_list == {0: [1, 2], 1: [3], 2: [3], 3: []}
+    array_graph = CompactSequenceGraph.from_graph(graph)
+    compact = extract_subgraph(array_graph, 4, 6, context=1).graph
+    assert np.shares_memory(compact.sequences, array_graph.sequences)
+    assert dict(compact.adj_list) == {0: [1, 2], 1: [3], 2: [3]}
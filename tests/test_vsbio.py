@@ -52,3 +52,70 @@ def test_random(bio_align, align_affine):
         a = list(np.random.randint(0, 4, 100))
         b = list(np.random.randint(0, 4, 90))
         assert bio_align(a, b) == align_affine(a, b)
+
+
+@pytest.fixture
+def align_low_memory():
+    return get_align_func(-3, get_score_mat(-1), -1, return_seq=True, low_memory=True)
+
+
+def test_low_memory(bio_align, align_low_memory):
+    a = [DNAAlphabet.to_num[c] for c in 'TTTATGACCAGGTCATTA']
+    b = [DNAAlphabet.to_num[c] for c in 'TTATGCCAGGTCTTA']
+    assert bio_align(a, b) == align_low_memory(a, b)
+
+
+@pytest.mark.parametrize("dtype", ["int16", "int32"])
+def test_integer_scores(bio_align, dtype):
+    align = get_align_func(-3, get_score_mat(-1), -1, return_seq=True, dtype=dtype)
+    a = [DNAAlphabet.to_num[c] for c in 'TTTATGACCAGGTCATTA']
+    b = [DNAAlphabet.to_num[c] for c in 'TTATGCCAGGTCTTA']
+    assert bio_align(a, b) == align(a, b)
+
+
+@pytest.mark.parametrize("adaptive", [False, True])
+def test_banded(bio_align, adaptive):
+    align = get_align_func(-3, get_score_mat(-1), -1, return_seq=True,
+                           band=4, adaptive_band=adaptive)
+    a = [DNAAlphabet.to_num[c] for c in 'TTTATGACCAGGTCATTA']
+    b = [DNAAlphabet.to_num[c] for c in 'TTATGCCAGGTCTTA']
+    assert align(a, b) == bio_align(a, b) + (False,)
+
+
+def test_banded_cut_off():
+    align = get_align_func(-3, get_score_mat(-1), -1, band=2)
+    a = [DNAAlphabet.to_num[c] for c in 'ACGTACGTACGTTTTTTTTT']
+    b = [DNAAlphabet.to_num[c] for c in 'TTTTTTTTT']
+    score, cut_off = align(a, b)
+    assert cut_off
+
+
+def test_banded_cut_off_off_edge():
+    a = [DNAAlphabet.to_num[c] for c in 'AACAAAACGAAATATTATTGAAGCAGA']
+    b = [DNAAlphabet.to_num[c] for c in 'CGTATTCGCGTCATAAA']
+    assert get_align_func(-3, get_score_mat(-1), -1)(a, b) == -13
+    score, cut_off = get_align_func(-3, get_score_mat(-1), -1, band=3)(a, b)
+    assert score < -13 and cut_off
+    path, score, cut_off = get_align_func(-3, get_score_mat(-1), -1, band=3, return_path=True)(a, b)
+    assert score < -13 and cut_off
+
+
+def test_x_drop(bio_align):
+    align = get_align_func(-3, get_score_mat(-1), -1, x_drop=10)
+    a = [DNAAlphabet.to_num[c] for c in 'TTTATGACCAGGTCATTA']
+    b = [DNAAlphabet.to_num[c] for c in 'TTATGCCAGGTCTTA']
+    assert align(a, b) == (bio_align(a, b)[2], False)
+    c = [DNAAlphabet.to_num[c] for c in 'GGGCGCGGACGCGGCCCG']
+    assert align(a, c)[1]
+
+
+def test_return_path(align_affine):
+    align = get_align_func(-3, get_score_mat(-1), -1, return_path=True)
+    a = [DNAAlphabet.to_num[c] for c in 'TTTATGACCAGGTCATTA']
+    b = [DNAAlphabet.to_num[c] for c in 'TTATGCCAGGTCTTA']
+    path, score = align(a, b)
+    alignment_a, alignment_b, true_score = align_affine(a, b)
+    assert score == true_score
+    assert path[0] == (0, 0) and path[-1] == (len(a), len(b))
+    assert "".join("-" if i == next_i else "ACGT"[a[next_i-1]]
+                   for (i, _), (next_i, _) in zip(path, path[1:])) == alignment_a
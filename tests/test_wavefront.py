@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from graphalign import get_align_func, get_score_mat, SequenceGraph
+
+
+@pytest.fixture
+def align_dp():
+    return get_align_func(-3, get_score_mat(-1), -1)
+
+
+@pytest.fixture
+def align_wfa():
+    return get_align_func(-3, get_score_mat(-1), -1, mode="wfa")
+
+
+@pytest.mark.parametrize("b", [[1, 2, 0, 3, 2, 1, 0],
+                               [1, 2, 0, 2, 2, 1, 0],
+                               [1, 2, 0, 2, 1, 0],
+                               [2, 0, 2, 2, 1, 0],
+                               []])
+def test_same_as_dp(align_dp, align_wfa, b):
+    a = [1, 2, 0, 3, 2, 1, 0]
+    assert align_wfa(a, b) == align_dp(a, b)
+
+
+def test_random_same_as_dp(align_dp, align_wfa):
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        a = rng.integers(0, 4, 60)
+        b = np.where(rng.random(60) < 0.1, (a+1) % 4, a)
+        b = np.delete(b, rng.integers(0, 60, 2))
+        assert align_wfa(list(a), list(b)) == align_dp(list(a), list(b))
+
+
+def test_graph(align_wfa, snp_graph):
+    assert align_wfa(snp_graph, [0, 1, 3, 0]) == 4
+    assert align_wfa([0, 1, 2, 0], snp_graph) == 4
+    assert align_wfa(snp_graph, [0, 1, 0]) == 0
+
+
+def test_wfa_options():
+    with pytest.raises(ValueError):
+        get_align_func(-3, get_score_mat(-1), -1, mode="wfa", return_seq=True)
+
+
+def test_graph_border(align_dp, align_wfa):
+    # Deleting the whole graph follows the edge from node 0 to node 4
+    graph = SequenceGraph([0, 0, 0, 1, 1, 0, 3, 1, 0], [0, 3, 4, 6, 7],
+                          {0: [1, 2, 3, 4], 1: [2, 3], 2: [3, 4], 3: [4]})
+    assert align_dp(graph, []) == align_wfa(graph, []) == -7
+    assert align_dp([], graph) == align_wfa([], graph) == -7
+    align_seq = get_align_func(-3, get_score_mat(-1), -1, return_seq=True)
+    assert align_seq(graph, []) == ("AAACA", "-----", -7)
+    for query in ([1, 0], [3, 3, 0], [0, 0, 0, 1, 0]):
+        assert align_dp(graph, query) == align_wfa(graph, query)
+        assert align_dp(query, graph) == align_wfa(query, graph)